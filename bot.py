@@ -1,11 +1,29 @@
 import discord
 from discord import app_commands
+from discord.ext import tasks
 from discord.ui import Select, View
+import io
 import os
+import re
+import math
+import time
+import threading
+import signal
 import asyncio
+import contextlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from dotenv import load_dotenv
 from weather_service import WeatherService
 from gemini_service import GeminiService
+from transport import create_transport
+from health_server import HealthServer
+from station_index import MISSING_VALUE
+from scheduler import UpstreamScheduler, BACKGROUND, priority
+from diagnostics import SamplingProfiler, MemoryTracker, measure_loop_lag, dump_tasks
+from forecast_snapshot import RANK_METRICS
+from forecast_archive import summarize_history
+from week_forecast import normalize_town
 
 # Load environment variables from .env file
 load_dotenv()
@@ -110,60 +128,99 @@ def get_weather_emoji(weather_description: str, pop: str) -> str:
     return "🌤️"
 
 
+def normalize_location(location: str) -> Optional[str]:
+    """
+    Normalize user input to the Chinese API location name
+
+    Args:
+        location: Location name in Chinese or English (aliases allowed)
+
+    Returns:
+        API location name, or None if the location is not supported
+    """
+    normalized_location = LOCATION_ALIASES.get(location.lower(), location)
+    return normalized_location if normalized_location in LOCATION_NAMES else None
+
+
+async def reject_if_shutting_down(interaction: discord.Interaction) -> bool:
+    """
+    Turn away new work while the bot is draining for a restart
+
+    Returns:
+        True if the interaction was rejected
+    """
+    if interaction.client.accepting:
+        return False
+
+    await interaction.response.send_message("🔄 機器人正在重新啟動，請稍後再試", ephemeral=True)
+    return True
+
+
+# Taiwan counties and major cities, built once and shared by the persistent picker
+LOCATION_OPTIONS = [
+    discord.SelectOption(label="台北市", value="臺北市", description="Taipei City"),
+    discord.SelectOption(label="新北市", value="新北市", description="New Taipei City"),
+    discord.SelectOption(label="桃園市", value="桃園市", description="Taoyuan City"),
+    discord.SelectOption(label="台中市", value="臺中市", description="Taichung City"),
+    discord.SelectOption(label="台南市", value="臺南市", description="Tainan City"),
+    discord.SelectOption(label="高雄市", value="高雄市", description="Kaohsiung City"),
+    discord.SelectOption(label="基隆市", value="基隆市", description="Keelung City"),
+    discord.SelectOption(label="新竹市", value="新竹市", description="Hsinchu City"),
+    discord.SelectOption(label="新竹縣", value="新竹縣", description="Hsinchu County"),
+    discord.SelectOption(label="苗栗縣", value="苗栗縣", description="Miaoli County"),
+    discord.SelectOption(label="彰化縣", value="彰化縣", description="Changhua County"),
+    discord.SelectOption(label="南投縣", value="南投縣", description="Nantou County"),
+    discord.SelectOption(label="雲林縣", value="雲林縣", description="Yunlin County"),
+    discord.SelectOption(label="嘉義市", value="嘉義市", description="Chiayi City"),
+    discord.SelectOption(label="嘉義縣", value="嘉義縣", description="Chiayi County"),
+    discord.SelectOption(label="屏東縣", value="屏東縣", description="Pingtung County"),
+    discord.SelectOption(label="宜蘭縣", value="宜蘭縣", description="Yilan County"),
+    discord.SelectOption(label="花蓮縣", value="花蓮縣", description="Hualien County"),
+    discord.SelectOption(label="台東縣", value="臺東縣", description="Taitung County"),
+    discord.SelectOption(label="澎湖縣", value="澎湖縣", description="Penghu County"),
+    discord.SelectOption(label="金門縣", value="金門縣", description="Kinmen County"),
+    discord.SelectOption(label="連江縣", value="連江縣", description="Lienchiang County"),
+]
+
+# Stable custom_id so the picker keeps working across restarts and shards
+LOCATION_SELECT_ID = "weather:location_select"
+
+
 class LocationSelect(Select):
     def __init__(self, weather_service, gemini_service):
         self.weather_service = weather_service
         self.gemini_service = gemini_service
 
-        # Taiwan counties and major cities
-        options = [
-            discord.SelectOption(label="台北市", value="臺北市", description="Taipei City"),
-            discord.SelectOption(label="新北市", value="新北市", description="New Taipei City"),
-            discord.SelectOption(label="桃園市", value="桃園市", description="Taoyuan City"),
-            discord.SelectOption(label="台中市", value="臺中市", description="Taichung City"),
-            discord.SelectOption(label="台南市", value="臺南市", description="Tainan City"),
-            discord.SelectOption(label="高雄市", value="高雄市", description="Kaohsiung City"),
-            discord.SelectOption(label="基隆市", value="基隆市", description="Keelung City"),
-            discord.SelectOption(label="新竹市", value="新竹市", description="Hsinchu City"),
-            discord.SelectOption(label="新竹縣", value="新竹縣", description="Hsinchu County"),
-            discord.SelectOption(label="苗栗縣", value="苗栗縣", description="Miaoli County"),
-            discord.SelectOption(label="彰化縣", value="彰化縣", description="Changhua County"),
-            discord.SelectOption(label="南投縣", value="南投縣", description="Nantou County"),
-            discord.SelectOption(label="雲林縣", value="雲林縣", description="Yunlin County"),
-            discord.SelectOption(label="嘉義市", value="嘉義市", description="Chiayi City"),
-            discord.SelectOption(label="嘉義縣", value="嘉義縣", description="Chiayi County"),
-            discord.SelectOption(label="屏東縣", value="屏東縣", description="Pingtung County"),
-            discord.SelectOption(label="宜蘭縣", value="宜蘭縣", description="Yilan County"),
-            discord.SelectOption(label="花蓮縣", value="花蓮縣", description="Hualien County"),
-            discord.SelectOption(label="台東縣", value="臺東縣", description="Taitung County"),
-            discord.SelectOption(label="澎湖縣", value="澎湖縣", description="Penghu County"),
-            discord.SelectOption(label="金門縣", value="金門縣", description="Kinmen County"),
-            discord.SelectOption(label="連江縣", value="連江縣", description="Lienchiang County"),
-        ]
-
         super().__init__(
             placeholder="請選擇縣市 / Select a location...",
             min_values=1,
             max_values=1,
-            options=options
+            options=LOCATION_OPTIONS,
+            custom_id=LOCATION_SELECT_ID
         )
 
     async def callback(self, interaction: discord.Interaction):
-        await interaction.response.defer(thinking=True)
+        # This one instance serves every message, so read the choice from the
+        # interaction itself rather than the shared `self.values`
+        selected_location = interaction.data['values'][0]
 
-        selected_location = self.values[0]
+        if await reject_if_shutting_down(interaction):
+            return
 
-        try:
-            embed = await create_weather_embed(
-                selected_location,
-                self.weather_service,
-                self.gemini_service
-            )
-            await interaction.followup.send(embed=embed)
+        async with interaction.client.track_work():
+            await interaction.response.defer(thinking=True)
 
-        except Exception as e:
-            print(f"Error: {e}")
-            await interaction.followup.send(f"❌ 發生錯誤: {str(e)}")
+            try:
+                embed = await create_weather_embed(
+                    selected_location,
+                    self.weather_service,
+                    self.gemini_service
+                )
+                await interaction.followup.send(embed=embed)
+
+            except Exception as e:
+                print(f"Error: {e}")
+                await interaction.followup.send(f"❌ 發生錯誤: {str(e)}")
 
 
 async def create_weather_embed(location: str, weather_service, gemini_service) -> discord.Embed:
@@ -264,9 +321,284 @@ async def create_weather_embed(location: str, weather_service, gemini_service) -
     return embed
 
 
+async def create_rank_embed(metric: str, weather_service) -> discord.Embed:
+    """
+    Create a cross-county ranking embed from the all-county snapshot
+
+    Args:
+        metric: Ranking metric key (see RANK_METRICS)
+        weather_service: WeatherService instance
+
+    Returns:
+        Discord Embed with the top counties
+    """
+    snapshot = await weather_service.get_forecast_snapshot()
+
+    if not snapshot:
+        raise ValueError("無法取得全台天氣資料")
+
+    metric_name, unit, _ = RANK_METRICS[metric]
+    ranking = snapshot.rank(metric, limit=10)
+
+    medals = ["🥇", "🥈", "🥉"]
+    lines = []
+    for idx, (location, score) in enumerate(ranking):
+        prefix = medals[idx] if idx < len(medals) else f"**{idx + 1}.**"
+        english_name = LOCATION_NAMES.get(location, "")
+        lines.append(f"{prefix} {location} ({english_name}) — **{score:g}{unit}**")
+
+    embed = discord.Embed(
+        title=f"🏆 全台縣市排行 - {metric_name}",
+        color=discord.Color.gold(),
+        description="\n".join(lines) or "目前沒有資料"
+    )
+
+    # Rankings cover the same two periods shown by /weather
+    periods = " / ".join(
+        f"{label} ({period['description']})"
+        for label, period in zip(snapshot.period_labels[:2], snapshot.periods[:2])
+    )
+    embed.add_field(name="⏰ 涵蓋時段", value=periods, inline=False)
+
+    embed.set_footer(
+        text=f"資料來源: 中央氣象署開放資料平台 | 發布時間 {snapshot.issued_at.strftime('%m/%d %H:%M')}"
+    )
+
+    return embed
+
+
+async def create_compare_embed(locations: list[str], weather_service) -> discord.Embed:
+    """
+    Create a side-by-side comparison embed for several counties
+
+    Args:
+        locations: Location names (Chinese API format)
+        weather_service: WeatherService instance
+
+    Returns:
+        Discord Embed with one field per location
+    """
+    snapshot = await weather_service.get_forecast_snapshot()
+
+    if not snapshot:
+        raise ValueError("無法取得全台天氣資料")
+
+    embed = discord.Embed(
+        title="📊 " + " vs ".join(locations) + " 天氣比較",
+        color=discord.Color.purple(),
+        description="今日與今晚天氣預報"
+    )
+
+    for result in snapshot.compare(locations):
+        location = result['location']
+        lines = []
+        for period in result['periods'][:2]:
+            period_weather_emoji = get_weather_emoji(
+                period.get('weather_description', ''),
+                period.get('pop', '0')
+            )
+            lines.append(
+                f"**{period['period_label']}:** {period_weather_emoji} {period['weather_description']}\n"
+                f"🌡️ {period['low_temp']}°C ~ {period['high_temp']}°C ☔ {period['pop']}%"
+            )
+
+        english_name = LOCATION_NAMES.get(location, "")
+        embed.add_field(
+            name=f"📍 {location} ({english_name})",
+            value="\n".join(lines),
+            inline=True
+        )
+
+    embed.set_footer(
+        text=f"資料來源: 中央氣象署開放資料平台 | 發布時間 {snapshot.issued_at.strftime('%m/%d %H:%M')}"
+    )
+
+    return embed
+
+
+def parse_history_range(text: str) -> Optional[timedelta]:
+    """
+    Parse a history range such as "7d" or "48h"
+
+    Args:
+        text: Range string (number followed by d/h)
+
+    Returns:
+        timedelta (at most 90 days), or None if the format is invalid
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*([dh])\s*", text.lower())
+    if not match:
+        return None
+
+    amount, unit = int(match.group(1)), match.group(2)
+    span = timedelta(days=amount) if unit == 'd' else timedelta(hours=amount)
+    if span <= timedelta(0) or span > timedelta(days=90):
+        return None
+    return span
+
+
+def format_value(value: float, spec: str = 'g', unit: str = '') -> str:
+    """Format an archived number for display ('N/A' if missing)"""
+    return 'N/A' if math.isnan(value) else f"{value:{spec}}{unit}"
+
+
+def create_history_embed(location: str, span: timedelta, weather_service) -> discord.Embed:
+    """
+    Create a forecast history embed from the local archive (no API calls)
+
+    Args:
+        location: Location name (Chinese API format)
+        span: How far back to look
+        weather_service: WeatherService instance
+
+    Returns:
+        Discord Embed with archived forecasts and trend stats
+    """
+    taiwan_tz = timezone(timedelta(hours=8))
+    rows = weather_service.archive.query(location, datetime.now(taiwan_tz) - span)
+    history = summarize_history(rows)
+
+    english_name = LOCATION_NAMES.get(location, "")
+    embed = discord.Embed(
+        title=f"📈 {location} ({english_name}) 預報紀錄",
+        color=discord.Color.teal()
+    )
+
+    if history['issuances'] == 0:
+        embed.description = "此期間沒有封存的預報資料"
+        return embed
+
+    # Latest forecast per target period, newest last (keep within embed limits)
+    lines = []
+    for start, low, high, pop in zip(history['start'], history['min_t'], history['max_t'], history['pop']):
+        start_tw = datetime.fromtimestamp(int(start), taiwan_tz)
+        period_emoji = "☀️" if 6 <= start_tw.hour < 18 else "🌙"
+        lines.append(
+            f"`{start_tw.strftime('%m/%d %H:%M')}` {period_emoji} "
+            f"{format_value(low)}~{format_value(high)}°C ☔ {format_value(pop, unit='%')}"
+        )
+    embed.description = "\n".join(lines[-40:])
+
+    embed.add_field(
+        name="📊 統計",
+        value=(
+            f"**平均高溫:** {format_value(history['mean_high'], '.1f', '°C')}\n"
+            f"**平均低溫:** {format_value(history['mean_low'], '.1f', '°C')}\n"
+            f"**最高 / 最低:** {format_value(history['max_high'], unit='°C')} / {format_value(history['min_low'], unit='°C')}\n"
+            f"**平均降雨機率:** {format_value(history['mean_pop'], '.0f', '%')}\n"
+            f"**平均預報修正 (高溫):** {format_value(history['mean_revision'], '.1f', '°C')}"
+        ),
+        inline=False
+    )
+
+    embed.set_footer(text=f"資料來源: 本機預報封存 | 共 {history['issuances']} 次發布")
+
+    return embed
+
+
+def create_now_embed(query: str, weather_service) -> discord.Embed:
+    """
+    Create a current-conditions embed from the nearest reporting stations
+
+    Args:
+        query: Township, county or "lat,lon" string
+        weather_service: WeatherService instance
+
+    Returns:
+        Discord Embed with observations from the nearest stations
+    """
+    stations = weather_service.stations
+    if stations is None:
+        raise ValueError("測站資料尚未載入，請稍後再試")
+
+    place = stations.resolve(query, weather_service.places)
+    if not place:
+        raise ValueError(f"找不到地點: {query}\n請輸入「縣市 鄉鎮區」(例: 臺北市 大安區) 或座標 (例: 25.03,121.56)")
+
+    lat, lon, name = place
+    embed = discord.Embed(
+        title=f"📡 {name} 目前天氣",
+        color=discord.Color.dark_teal(),
+        description="最近的氣象站即時觀測 (自動站與局屬站)"
+    )
+
+    for station in stations.nearest(lat, lon, k=3):
+        lines = [f"**距離:** {station['distance']:.1f} 公里"]
+        if station['weather'] and station['weather'] != str(MISSING_VALUE):
+            lines.append(f"**天氣:** {get_weather_emoji(station['weather'], '0')} {station['weather']}")
+        lines.append(f"**溫度:** 🌡️ {station['temperature']:.1f}°C")
+        if not math.isnan(station['humidity']):
+            lines.append(f"**濕度:** 💧 {station['humidity']:.0f}%")
+        if not math.isnan(station['wind_speed']):
+            lines.append(f"**風速:** 💨 {station['wind_speed']:.1f} m/s")
+        if not math.isnan(station['precipitation']):
+            lines.append(f"**累積雨量:** ☔ {station['precipitation']:.1f} mm")
+
+        embed.add_field(
+            name=f"📍 {station['name']} ({station['county']}{station['town']})",
+            value="\n".join(lines),
+            inline=False
+        )
+
+    observed = stations.observed_at.strftime('%m/%d %H:%M') if stations.observed_at else "N/A"
+    embed.set_footer(text=f"資料來源: 中央氣象署氣象站觀測 | 觀測時間 {observed}")
+
+    return embed
+
+
+def create_week_embed(location: str, town: Optional[str], weather_service) -> discord.Embed:
+    """
+    Create a 7-day forecast embed from the cached township arrays (no API calls)
+
+    Args:
+        location: County name (Chinese API format)
+        town: Township name, or None for the county-wide median
+        weather_service: WeatherService instance
+
+    Returns:
+        Discord Embed with one line per day
+    """
+    week = weather_service.week
+    if week is None:
+        raise ValueError("一週預報資料尚未載入，請稍後再試")
+
+    town = normalize_town(town) if town else None
+
+    days = week.daily(location, town)
+    if days is None:
+        raise ValueError(f"找不到地點: {location} {town or ''}")
+
+    english_name = LOCATION_NAMES.get(location, "")
+    place = f"{location} {town}" if town else f"{location} ({english_name})"
+    embed = discord.Embed(
+        title=f"📅 {place} 一週天氣預報",
+        color=discord.Color.blue(),
+        description=None if town else "全縣市各鄉鎮中位數"
+    )
+
+    weekdays = "一二三四五六日"
+    lines = []
+    for day in days:
+        pop = str(day['pop']) if day['pop'] is not None else 'N/A'
+        low = day['low_temp'] if day['low_temp'] is not None else 'N/A'
+        high = day['high_temp'] if day['high_temp'] is not None else 'N/A'
+        weather_emoji = get_weather_emoji(day['weather_description'], pop)
+        lines.append(
+            f"`{day['date'].strftime('%m/%d')} ({weekdays[day['date'].weekday()]})` "
+            f"{weather_emoji} {day['weather_description'] or 'N/A'} {low}~{high}°C ☔ {pop}%"
+        )
+
+    embed.add_field(name="🗓️ 每日預報", value="\n".join(lines) or "目前沒有資料", inline=False)
+    embed.set_footer(text="資料來源: 中央氣象署開放資料平台 (鄉鎮一週預報)")
+
+    return embed
+
+
 class LocationView(View):
+    """Persistent location picker, registered once in setup_hook and reused for every /weather"""
+
     def __init__(self, weather_service, gemini_service):
-        super().__init__(timeout=180)
+        super().__init__(timeout=None)
         self.add_item(LocationSelect(weather_service, gemini_service))
 
 
@@ -276,12 +608,137 @@ class WeatherBot(discord.Client):
         intents = discord.Intents.default()
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
-        self.weather_service = WeatherService()
-        self.gemini_service = GeminiService()
+
+        # One transport (live / record / replay) shared by both services, with every
+        # outbound call queued by priority: interactive > scheduled > background.
+        # CWA ('http') and Gemini each get their own concurrency budget.
+        transport = create_transport()
+        preempt_threshold = int(os.getenv('UPSTREAM_PREEMPT_THRESHOLD', '2'))
+        self.schedulers = {
+            'http': UpstreamScheduler(int(os.getenv('UPSTREAM_CONCURRENCY', '4')), preempt_threshold=preempt_threshold),
+            'gemini': UpstreamScheduler(int(os.getenv('GEMINI_CONCURRENCY', '4')), preempt_threshold=preempt_threshold),
+        }
+        transport.schedulers = self.schedulers
+        self.weather_service = WeatherService(transport)
+        self.gemini_service = GeminiService(transport)
+        self.location_view = None
+
+        # Graceful shutdown: stop taking work, drain in-flight interactions, save caches
+        self.accepting = True
+        self.warm = False
+        self.in_flight_tasks = {}  # Task -> start time (time.monotonic), also used by /debug tasks
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.shutdown_task = None  # Strong reference so the drain is not garbage-collected
+        self.drain_timeout = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '25'))
+        self.cache_dir = os.getenv('CACHE_DIR', 'data/cache')
+
+        # Local readiness probe for docker health checks
+        self.health_server = HealthServer(
+            os.getenv('HEALTH_HOST', '127.0.0.1'),
+            int(os.getenv('HEALTH_PORT', '8080')),
+            self.is_serving
+        )
+        self.health_server.add_json_route('/stats', self.upstream_stats)
 
     async def setup_hook(self):
+        # Start warm from the caches the previous process left behind
+        if self.weather_service.load_cache(self.cache_dir):
+            print("Restored forecast snapshot from cache")
+
+        await self.health_server.start()
+
+        # Register the persistent picker so dropdowns from before a restart still work
+        self.location_view = LocationView(self.weather_service, self.gemini_service)
+        self.add_view(self.location_view)
+
         await self.tree.sync()
         print("Commands synced!")
+        self.refresh_snapshot.start()
+        self.refresh_stations.start()
+        self.refresh_week_forecast.start()
+
+    def is_serving(self) -> bool:
+        """Ready for traffic: connected, caches warm and not shutting down"""
+        return self.accepting and self.warm and self.is_ready()
+
+    def is_owner(self, user: discord.abc.User) -> bool:
+        """Bot owner check: BOT_OWNER_IDS if set, otherwise the application owner or team"""
+        owner_ids = os.getenv('BOT_OWNER_IDS')
+        if owner_ids:
+            return str(user.id) in {owner_id.strip() for owner_id in owner_ids.split(',')}
+
+        application = self.application
+        if application is None:
+            return False
+        if application.team:
+            return user.id in {member.id for member in application.team.members}
+        return application.owner is not None and user.id == application.owner.id
+
+    def upstream_stats(self) -> dict:
+        """Queue statistics of every upstream scheduler, keyed by upstream"""
+        return {upstream: scheduler.stats() for upstream, scheduler in self.schedulers.items()}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.in_flight_tasks)
+
+    @contextlib.asynccontextmanager
+    async def track_work(self):
+        """Count an interaction as in-flight so shutdown can wait for it"""
+        task = asyncio.current_task()
+        self.in_flight_tasks[task] = time.monotonic()
+        self.drained.clear()
+        try:
+            yield
+        finally:
+            self.in_flight_tasks.pop(task, None)
+            if not self.in_flight_tasks:
+                self.drained.set()
+
+    async def graceful_shutdown(self):
+        """Stop accepting work, drain in-flight interactions, then save caches and close"""
+        if not self.accepting:
+            return
+        self.accepting = False
+        self.refresh_snapshot.cancel()
+        self.refresh_stations.cancel()
+        self.refresh_week_forecast.cancel()
+
+        print(f"Shutting down: draining {self.in_flight} in-flight request(s)...")
+        try:
+            await asyncio.wait_for(self.drained.wait(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"Drain timed out, {self.in_flight} request(s) still running")
+
+        try:
+            if self.weather_service.save_cache(self.cache_dir):
+                print("Saved forecast snapshot to cache")
+        except Exception as e:
+            print(f"Error saving caches: {e}")
+
+        await self.health_server.stop()
+        await self.close()
+
+    @tasks.loop(minutes=5)
+    async def refresh_snapshot(self):
+        """Keep the all-county snapshot (and therefore the archive) up to date"""
+        # Only hits the API while a new issuance or period window is due and not yet fetched
+        with priority(BACKGROUND):
+            if await self.weather_service.refresh_snapshot():
+                self.warm = True
+
+    @tasks.loop(minutes=10)
+    async def refresh_stations(self):
+        """Bulk-refresh station observations for /now (one request for all stations)"""
+        with priority(BACKGROUND):
+            await self.weather_service.refresh_stations()
+
+    @tasks.loop(hours=3)
+    async def refresh_week_forecast(self):
+        """Bulk-refresh the 7-day township forecast for /week (one request for all of Taiwan)"""
+        with priority(BACKGROUND):
+            await self.weather_service.refresh_week_forecast()
 
 
 client = WeatherBot()
@@ -331,40 +788,310 @@ async def weather(interaction: discord.Interaction, location: str = None):
 
     if location:
         # Direct weather query
+        if await reject_if_shutting_down(interaction):
+            return
+
+        async with client.track_work():
+            await interaction.response.defer(thinking=True)
+
+            try:
+                # Normalize location (handle aliases)
+                normalized_location = normalize_location(location)
+
+                # Check if valid location
+                if not normalized_location:
+                    await interaction.followup.send(
+                        f"❌ 找不到地點: {location}\n請使用 `/weather` 查看所有可用地點"
+                    )
+                    return
+
+                # Create and send weather embed
+                embed = await create_weather_embed(
+                    normalized_location,
+                    client.weather_service,
+                    client.gemini_service
+                )
+                await interaction.followup.send(embed=embed)
+
+            except Exception as e:
+                print(f"Error: {e}")
+                await interaction.followup.send(f"❌ 發生錯誤: {str(e)}")
+
+    else:
+        # Show dropdown selector
+        await interaction.response.send_message(
+            "請選擇要查詢的縣市 📍\nPlease select a location:",
+            view=client.location_view
+        )
+
+
+@client.tree.command(name="rank", description="全台縣市天氣排行 / Rank Taiwan counties by weather")
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.describe(metric="排行項目 / Ranking metric")
+@app_commands.choices(metric=[
+    app_commands.Choice(name="🔥 最熱 / Hottest", value="hottest"),
+    app_commands.Choice(name="🥶 最冷 / Coldest", value="coldest"),
+    app_commands.Choice(name="☔ 最可能下雨 / Rainiest", value="rainiest"),
+    app_commands.Choice(name="🌡️ 日夜溫差最大 / Largest day-night swing", value="swing"),
+])
+async def rank(interaction: discord.Interaction, metric: app_commands.Choice[str]):
+    """Rank all counties by a weather metric"""
+    if await reject_if_shutting_down(interaction):
+        return
+
+    async with client.track_work():
         await interaction.response.defer(thinking=True)
 
         try:
-            # Normalize location (handle aliases)
-            normalized_location = LOCATION_ALIASES.get(location.lower(), location)
+            embed = await create_rank_embed(metric.value, client.weather_service)
+            await interaction.followup.send(embed=embed)
 
-            # Check if valid location
-            if normalized_location not in LOCATION_NAMES:
-                await interaction.followup.send(
-                    f"❌ 找不到地點: {location}\n請使用 `/weather` 查看所有可用地點"
-                )
-                return
+        except Exception as e:
+            print(f"Error: {e}")
+            await interaction.followup.send(f"❌ 發生錯誤: {str(e)}")
 
-            # Create and send weather embed
-            embed = await create_weather_embed(
-                normalized_location,
-                client.weather_service,
-                client.gemini_service
-            )
+
+@client.tree.command(name="compare", description="比較多個縣市天氣 / Compare weather across locations")
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.describe(
+    a="第一個縣市 / First location",
+    b="第二個縣市 / Second location",
+    c="第三個縣市 (選填) / Third location (optional)"
+)
+@app_commands.autocomplete(a=location_autocomplete, b=location_autocomplete, c=location_autocomplete)
+async def compare(interaction: discord.Interaction, a: str, b: str, c: str = None):
+    """Compare forecasts for two or three locations side by side"""
+    if await reject_if_shutting_down(interaction):
+        return
+
+    async with client.track_work():
+        await interaction.response.defer(thinking=True)
+
+        try:
+            locations = []
+            for location in [a, b, c]:
+                if location is None:
+                    continue
+
+                normalized_location = normalize_location(location)
+                if not normalized_location:
+                    await interaction.followup.send(
+                        f"❌ 找不到地點: {location}\n請使用 `/weather` 查看所有可用地點"
+                    )
+                    return
+
+                if normalized_location not in locations:
+                    locations.append(normalized_location)
+
+            embed = await create_compare_embed(locations, client.weather_service)
             await interaction.followup.send(embed=embed)
 
         except Exception as e:
             print(f"Error: {e}")
             await interaction.followup.send(f"❌ 發生錯誤: {str(e)}")
 
-    else:
-        # Show dropdown selector
-        view = LocationView(client.weather_service, client.gemini_service)
+
+@client.tree.command(name="history", description="查詢縣市過去的預報紀錄 / Show archived forecasts")
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.describe(
+    location="選擇縣市 (可輸入中文或英文) / Select location (Chinese or English)",
+    period="查詢範圍，例如 7d 或 48h / Range such as 7d or 48h"
+)
+@app_commands.autocomplete(location=location_autocomplete)
+async def history(interaction: discord.Interaction, location: str, period: str = "7d"):
+    """Show archived forecasts and trend stats for a location"""
+    normalized_location = normalize_location(location)
+    if not normalized_location:
         await interaction.response.send_message(
-            "請選擇要查詢的縣市 📍\nPlease select a location:",
-            view=view
+            f"❌ 找不到地點: {location}\n請使用 `/weather` 查看所有可用地點"
+        )
+        return
+
+    span = parse_history_range(period)
+    if not span:
+        await interaction.response.send_message("❌ 無效的範圍，請使用例如 `7d` 或 `48h` (最多 90 天)")
+        return
+
+    try:
+        embed = create_history_embed(normalized_location, span, client.weather_service)
+        await interaction.response.send_message(embed=embed)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        await interaction.response.send_message(f"❌ 發生錯誤: {str(e)}")
+
+
+async def place_autocomplete(
+    interaction: discord.Interaction,
+    current: str,
+) -> list[app_commands.Choice[str]]:
+    """Autocomplete for townships and counties"""
+    places = interaction.client.weather_service.places
+
+    current = current.strip().replace('台', '臺')
+    return [
+        app_commands.Choice(name=place, value=place)
+        for place in sorted(places)
+        if current in place
+    ][:25]
+
+
+async def town_autocomplete(
+    interaction: discord.Interaction,
+    current: str,
+) -> list[app_commands.Choice[str]]:
+    """Autocomplete for townships of the county chosen in the same command"""
+    week = interaction.client.weather_service.week
+    county = normalize_location(interaction.namespace.location or "")
+    if week is None or not county:
+        return []
+
+    current = normalize_town(current)
+    return [
+        app_commands.Choice(name=town, value=town)
+        for town in week.towns_in(county)
+        if current in town
+    ][:25]
+
+
+@client.tree.command(name="week", description="查詢一週天氣預報 / Get 7-day forecast")
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.describe(
+    location="選擇縣市 (可輸入中文或英文) / Select location (Chinese or English)",
+    town="鄉鎮區 (選填) / Township (optional)"
+)
+@app_commands.autocomplete(location=location_autocomplete, town=town_autocomplete)
+async def week(interaction: discord.Interaction, location: str, town: str = None):
+    """Show the 7-day forecast for a county or township"""
+    normalized_location = normalize_location(location)
+    if not normalized_location:
+        await interaction.response.send_message(
+            f"❌ 找不到地點: {location}\n請使用 `/weather` 查看所有可用地點"
+        )
+        return
+
+    try:
+        embed = create_week_embed(normalized_location, town, client.weather_service)
+        await interaction.response.send_message(embed=embed)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        await interaction.response.send_message(f"❌ 發生錯誤: {str(e)}")
+
+
+@client.tree.command(name="now", description="查詢附近測站的即時天氣 / Current conditions from nearby stations")
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.describe(location="鄉鎮區或座標，例如 臺北市 大安區 或 25.03,121.56 / Township or lat,lon")
+@app_commands.autocomplete(location=place_autocomplete)
+async def now(interaction: discord.Interaction, location: str):
+    """Show observations from the stations nearest to a township or coordinate"""
+    try:
+        embed = create_now_embed(location, client.weather_service)
+        await interaction.response.send_message(embed=embed)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        await interaction.response.send_message(f"❌ 發生錯誤: {str(e)}")
+
+
+def text_file(text: str, filename: str) -> discord.File:
+    """Wrap a text report as a Discord attachment"""
+    return discord.File(io.BytesIO(text.encode('utf-8')), filename=filename)
+
+
+@app_commands.allowed_installs(guilds=True, users=True)
+@app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
+@app_commands.default_permissions(administrator=True)
+class DebugGroup(app_commands.Group, name="debug", description="擁有者專用診斷工具 / Owner-only diagnostics"):
+    """Runtime diagnostics for the bot owner; nothing runs until a command is used"""
+
+    def __init__(self):
+        super().__init__()
+        self.profiler = SamplingProfiler()
+        self.memory = MemoryTracker()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.client.is_owner(interaction.user):
+            return True
+        await interaction.response.send_message("⛔ 此指令僅限機器人擁有者使用", ephemeral=True)
+        return False
+
+    @app_commands.command(name="profile", description="CPU 取樣分析 / Sample the event loop for N seconds")
+    @app_commands.describe(seconds="取樣秒數 / Seconds to sample")
+    async def profile(self, interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 120] = 10):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        try:
+            # Sample the event loop thread from a worker thread
+            report = await asyncio.to_thread(self.profiler.run, threading.get_ident(), seconds)
+            await interaction.followup.send(
+                f"🔬 CPU 分析完成 ({seconds} 秒)",
+                file=text_file(report, "profile.txt"),
+                ephemeral=True
+            )
+
+        except Exception as e:
+            print(f"Error: {e}")
+            await interaction.followup.send(f"❌ 發生錯誤: {str(e)}", ephemeral=True)
+
+    @app_commands.command(name="memory", description="tracemalloc 快照 / Take and diff tracemalloc snapshots")
+    @app_commands.describe(action="動作 / Action")
+    @app_commands.choices(action=[
+        app_commands.Choice(name="start", value="start"),
+        app_commands.Choice(name="snapshot", value="snapshot"),
+        app_commands.Choice(name="diff", value="diff"),
+        app_commands.Choice(name="stop", value="stop"),
+    ])
+    async def memory(self, interaction: discord.Interaction, action: app_commands.Choice[str]):
+        # Every action may wait for (or be) a slow snapshot, so answer later from a worker thread
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        try:
+            if action.value in ("start", "stop"):
+                message = await asyncio.to_thread(self.memory.start if action.value == "start" else self.memory.stop)
+                await interaction.followup.send(f"🧠 {message}", ephemeral=True)
+            else:
+                report = await asyncio.to_thread(
+                    self.memory.snapshot if action.value == "snapshot" else self.memory.diff
+                )
+                await interaction.followup.send(
+                    f"🧠 tracemalloc {action.value}",
+                    file=text_file(report, f"memory-{action.value}.txt"),
+                    ephemeral=True
+                )
+
+        except Exception as e:
+            print(f"Error: {e}")
+            await interaction.followup.send(f"❌ 發生錯誤: {str(e)}", ephemeral=True)
+
+    @app_commands.command(name="tasks", description="列出 asyncio 任務與事件迴圈延遲 / Dump tasks and loop lag")
+    async def tasks_command(self, interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
+        lag = await measure_loop_lag()
+        report = dump_tasks(interaction.client.in_flight_tasks)
+        upstream = "\n".join(
+            f"{upstream} {name}: 排隊 {stats['queued']} / 執行中 {stats['running']} / p95 等待 {stats['wait_p95_ms']} ms"
+            for upstream, classes in interaction.client.upstream_stats().items()
+            for name, stats in classes.items()
+        )
+
+        await interaction.followup.send(
+            f"⏱️ 事件迴圈延遲: 平均 {lag['mean_ms']:.2f} ms / 最大 {lag['max_ms']:.2f} ms\n"
+            f"📨 處理中的請求: {interaction.client.in_flight}\n{upstream}",
+            file=text_file(report, "tasks.txt"),
+            ephemeral=True
         )
 
 
+client.tree.add_command(DebugGroup())
+
+
 @client.tree.command(name="help", description="顯示使用說明 / Show help")
 @app_commands.allowed_installs(guilds=True, users=True)
 @app_commands.allowed_contexts(guilds=True, dms=True, private_channels=True)
@@ -381,6 +1108,11 @@ async def help_command(interaction: discord.Interaction):
         value=(
             "**方法 1:** `/weather` - 顯示選單選擇縣市\n"
             "**方法 2:** `/weather location:台北市` - 直接查詢\n"
+            "**排行:** `/rank` - 全台縣市最熱、最冷、最可能下雨、溫差最大\n"
+            "**比較:** `/compare a:台北市 b:高雄市` - 並排比較多個縣市\n"
+            "**紀錄:** `/history location:台北市 period:7d` - 過去的預報與趨勢\n"
+            "**即時:** `/now location:臺北市 大安區` - 最近測站的即時觀測\n"
+            "**一週:** `/week location:台北市 town:大安區` - 鄉鎮一週天氣預報\n"
             "💡 支援中英文輸入 (例: Taipei, 台北市)\n"
             "💬 可在伺服器頻道或私訊中使用"
         ),
@@ -402,12 +1134,32 @@ async def help_command(interaction: discord.Interaction):
     await interaction.response.send_message(embed=embed)
 
 
+async def run_bot(token: str):
+    """Run the bot and shut down gracefully on SIGTERM / SIGINT"""
+    loop = asyncio.get_running_loop()
+
+    def request_shutdown():
+        if client.shutdown_task is None:
+            client.shutdown_task = asyncio.create_task(client.graceful_shutdown())
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, request_shutdown)
+        except NotImplementedError:
+            # Windows event loops do not support signal handlers
+            pass
+
+    async with client:
+        await client.start(token)
+
+
 def main():
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
         raise ValueError("請設定 DISCORD_BOT_TOKEN 環境變數")
 
-    client.run(token)
+    discord.utils.setup_logging()
+    asyncio.run(run_bot(token))
 
 
 if __name__ == "__main__":
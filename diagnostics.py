@@ -0,0 +1,173 @@
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional, Dict, List
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler for one thread (normally the event loop)
+
+    A helper thread reads the target thread's current frame at a fixed
+    interval. Nothing is installed between runs, so there is no overhead
+    while it is not profiling.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()  # Held while a run is in progress
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, thread_id: int, seconds: float) -> str:
+        """
+        Sample `thread_id` for `seconds` (blocking - call from a worker thread)
+
+        Returns:
+            Report with the hottest functions followed by collapsed stacks
+            (one "frame;frame;frame count" line per stack, flamegraph.pl format)
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("已有分析正在進行中")
+
+        stacks = Counter()
+        samples = 0
+        try:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    stacks[';'.join(reversed(stack))] += 1
+                    samples += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+
+        # Leaf frame of each stack = where the thread was actually running
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+
+        lines = [f"# {samples} samples over {seconds:g}s (interval {self.interval * 1000:g} ms)", "", "# Top functions (self time)"]
+        for leaf, count in leaves.most_common(30):
+            lines.append(f"{100 * count / max(samples, 1):6.2f}%  {leaf}")
+
+        lines += ["", "# Collapsed stacks"]
+        lines += [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return "\n".join(lines)
+
+
+class MemoryTracker:
+    """
+    Start/stop tracemalloc on demand and diff consecutive snapshots
+
+    `snapshot` and `diff` are slow on a large heap and are meant to run in a
+    worker thread; a lock serializes them with each other and with start/stop.
+    """
+
+    def __init__(self):
+        self.snapshots: List[tracemalloc.Snapshot] = []
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 10) -> str:
+        with self._lock:
+            if tracemalloc.is_tracing():
+                return "tracemalloc 已在追蹤中"
+            tracemalloc.start(frames)
+            self.snapshots = []
+            return f"tracemalloc 已啟動 ({frames} frames)"
+
+    def stop(self) -> str:
+        # Waits for a snapshot running in a worker thread to finish first
+        with self._lock:
+            tracemalloc.stop()
+            self.snapshots = []
+            return "tracemalloc 已停止"
+
+    def snapshot(self, limit: int = 30) -> str:
+        """Take a snapshot and report the largest allocation sites"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc 尚未啟動")
+
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            # Keep the previous one for diffing
+            self.snapshots = self.snapshots[-1:] + [snapshot]
+
+            current, peak = tracemalloc.get_traced_memory()
+            lines = [f"# Traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+            lines += [str(stat) for stat in snapshot.statistics('lineno')[:limit]]
+            return "\n".join(lines)
+
+    def diff(self, limit: int = 30) -> str:
+        """Report the allocation sites that changed most between the last two snapshots"""
+        with self._lock:
+            if len(self.snapshots) < 2:
+                raise RuntimeError("需要至少兩個快照才能比較")
+            older, newer = self.snapshots[-2], self.snapshots[-1]
+
+        lines = ["# Top differences between the last two snapshots", ""]
+        lines += [str(stat) for stat in newer.compare_to(older, 'lineno')[:limit]]
+        return "\n".join(lines)
+
+
+async def measure_loop_lag(samples: int = 20, interval: float = 0.05) -> Dict[str, float]:
+    """
+    Measure event-loop lag by timing how late short sleeps wake up
+
+    Returns:
+        {'mean_ms', 'max_ms'} over the samples
+    """
+    lags = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+    return {
+        'mean_ms': 1000 * sum(lags) / len(lags),
+        'max_ms': 1000 * max(lags),
+    }
+
+
+def dump_tasks(started_at: Optional[Dict[asyncio.Task, float]] = None, slow_after: float = 5.0) -> str:
+    """
+    Describe every pending asyncio task with its current stack
+
+    Args:
+        started_at: Known start times (time.monotonic) for tracked tasks
+        slow_after: Age in seconds after which a tracked task is flagged as slow
+
+    Returns:
+        Text report, tracked tasks first (oldest first)
+    """
+    started_at = started_at or {}
+    now = time.monotonic()
+
+    def age(task):
+        return now - started_at[task] if task in started_at else -1.0
+
+    lines = []
+    for task in sorted(asyncio.all_tasks(), key=age, reverse=True):
+        task_age = age(task)
+        marker = "SLOW " if task_age >= slow_after else ""
+        age_text = f"{task_age:.1f}s" if task_age >= 0 else "untracked"
+        lines.append(f"{marker}[{age_text}] {task.get_name()}: {task.get_coro()!r}")
+        for frame in task.get_stack():
+            lines.append(f"    {frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_lineno})")
+        lines.append("")
+
+    return "\n".join(lines)
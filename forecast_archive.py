@@ -0,0 +1,264 @@
+import numpy as np
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List
+
+from forecast_snapshot import ForecastSnapshot, MIN_T, MAX_T, POP
+
+
+# Stable county codes used in the archive (never reorder, only append)
+COUNTIES = (
+    "臺北市", "新北市", "桃園市", "臺中市", "臺南市", "高雄市",
+    "基隆市", "新竹市", "新竹縣", "苗栗縣", "彰化縣", "南投縣",
+    "雲林縣", "嘉義市", "嘉義縣", "屏東縣", "宜蘭縣", "花蓮縣",
+    "臺東縣", "澎湖縣", "金門縣", "連江縣",
+)
+COUNTY_CODES = {name: code for code, name in enumerate(COUNTIES)}
+
+# Column layout: every column is a contiguous array of CAPACITY_ROWS values
+COLUMNS = (
+    ('issued', np.int64),   # Issuance time (epoch seconds)
+    ('start', np.int64),    # Period start time (epoch seconds)
+    ('min_t', np.float32),
+    ('max_t', np.float32),
+    ('pop', np.float32),
+    ('county', np.int8),    # Index into COUNTIES
+    ('period', np.int8),    # Period index within the issuance
+)
+
+# Room for 256 issuances x 22 counties x 3 periods per month (~0.5 MB per file)
+CAPACITY_ROWS = 256 * len(COUNTIES) * 3
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('rows', '<i8'), ('capacity', '<i8'), ('reserved', 'S40')])
+MAGIC = b'FCARCH01'
+
+TAIWAN_TZ = timezone(timedelta(hours=8))
+
+
+def _column_offsets() -> Dict[str, int]:
+    """Byte offset of each column inside a month file"""
+    offsets = {}
+    offset = HEADER_DTYPE.itemsize
+    for name, dtype in COLUMNS:
+        offsets[name] = offset
+        offset += CAPACITY_ROWS * np.dtype(dtype).itemsize
+    offsets['_end'] = offset
+    return offsets
+
+
+COLUMN_OFFSETS = _column_offsets()
+
+
+def _to_epoch(value: datetime) -> int:
+    """Convert a datetime (naive values are Taiwan time) to epoch seconds"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=TAIWAN_TZ)
+    return int(value.timestamp())
+
+
+class ForecastArchive:
+    """
+    Append-only columnar archive of F-C0032-001 issuances
+
+    Each month is one pre-allocated file: a small header followed by one
+    contiguous column per field. Appends write straight into the memory-mapped
+    columns and queries slice them without loading the whole file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, year: int, month: int) -> str:
+        return os.path.join(self.directory, f"forecast-{year:04d}-{month:02d}.bin")
+
+    def _create(self, path: str):
+        """Create an empty, fully pre-allocated month file"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.truncate(COLUMN_OFFSETS['_end'])
+
+        header = np.memmap(path, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        header[0] = (MAGIC, 0, CAPACITY_ROWS, b'')
+        header.flush()
+
+    def _open(self, path: str, mode: str):
+        """
+        Memory-map a month file
+
+        Returns:
+            Tuple of (header, {column name: memmap})
+        """
+        header = np.memmap(path, dtype=HEADER_DTYPE, mode=mode, shape=(1,))
+        if header[0]['magic'] != MAGIC:
+            raise ValueError(f"無效的預報封存檔: {path}")
+
+        columns = {
+            name: np.memmap(path, dtype=dtype, mode=mode, offset=COLUMN_OFFSETS[name], shape=(CAPACITY_ROWS,))
+            for name, dtype in COLUMNS
+        }
+        return header, columns
+
+    def append(self, snapshot: ForecastSnapshot) -> int:
+        """
+        Append a snapshot to the month file of its issuance
+
+        Periods already archived for the same issuance are skipped, so it is
+        safe to call after every refresh.
+
+        Args:
+            snapshot: Parsed all-county snapshot
+
+        Returns:
+            Number of rows written
+        """
+        issued = _to_epoch(snapshot.issued_at)
+        path = self._path(snapshot.issued_at.year, snapshot.issued_at.month)
+        if not os.path.exists(path):
+            self._create(path)
+
+        header, columns = self._open(path, 'r+')
+        rows = int(header[0]['rows'])
+
+        # Rows are stored in issuance order, so only the tail can overlap
+        last_start = None
+        if rows:
+            last_issued = columns['issued'][rows - 1]
+            if issued < last_issued:
+                return 0
+            if issued == last_issued:
+                last_start = columns['start'][rows - 1]
+
+        counties = np.array([COUNTY_CODES.get(name, -1) for name in snapshot.locations], dtype=np.int8)
+        known = counties >= 0
+
+        # Period-major order keeps `start` non-decreasing within an issuance
+        new_rows = []
+        for period_idx, period in enumerate(snapshot.periods):
+            start = _to_epoch(period['start_time'])
+            if last_start is not None and start <= last_start:
+                continue
+            new_rows.append((period_idx, start))
+
+        count = len(new_rows) * int(known.sum())
+        if count == 0:
+            return 0
+        if rows + count > CAPACITY_ROWS:
+            print(f"Forecast archive full: {path}")
+            return 0
+
+        end = rows
+        for period_idx, start in new_rows:
+            block = slice(end, end + int(known.sum()))
+            values = snapshot.values[known, period_idx, :]
+            columns['issued'][block] = issued
+            columns['start'][block] = start
+            columns['min_t'][block] = values[:, MIN_T]
+            columns['max_t'][block] = values[:, MAX_T]
+            columns['pop'][block] = values[:, POP]
+            columns['county'][block] = counties[known]
+            columns['period'][block] = period_idx
+            end = block.stop
+
+        for column in columns.values():
+            column.flush()
+
+        # Publish the rows only after the data is on disk
+        header[0]['rows'] = end
+        header.flush()
+
+        return count
+
+    def _months(self, since: datetime, until: datetime) -> List[str]:
+        """Month files that may contain issuances between `since` and `until`"""
+        paths = []
+        year, month = since.year, since.month
+        while (year, month) <= (until.year, until.month):
+            path = self._path(year, month)
+            if os.path.exists(path):
+                paths.append(path)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return paths
+
+    def query(self, location: str, since: datetime, until: Optional[datetime] = None) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Get every archived forecast row for a county issued in [since, until)
+
+        Args:
+            location: Location name (Chinese API format)
+            since: Earliest issuance time
+            until: Latest issuance time (exclusive, defaults to now)
+
+        Returns:
+            Dictionary of column arrays (copies of the matching rows only),
+            or None if the location is not archived
+        """
+        county = COUNTY_CODES.get(location)
+        if county is None:
+            return None
+
+        until = until or datetime.now(TAIWAN_TZ)
+        since_epoch, until_epoch = _to_epoch(since), _to_epoch(until)
+
+        parts = {name: [] for name, _ in COLUMNS}
+        for path in self._months(since, until):
+            header, columns = self._open(path, 'r')
+            rows = int(header[0]['rows'])
+
+            # `issued` is sorted, so the time range is a contiguous slice
+            issued = columns['issued'][:rows]
+            lo, hi = np.searchsorted(issued, [since_epoch, until_epoch])
+            mask = columns['county'][lo:hi] == county
+
+            for name, _ in COLUMNS:
+                parts[name].append(np.asarray(columns[name][lo:hi][mask]))
+
+        return {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+            for (name, dtype), chunks in zip(COLUMNS, parts.values())
+        }
+
+
+def summarize_history(rows: Dict[str, np.ndarray]) -> Dict:
+    """
+    Reduce archived rows to one forecast per target period plus trend stats
+
+    For each period start the latest issuance is kept as "the" forecast, and
+    the difference to the earliest issuance for the same period measures how
+    much the forecast was revised (only periods issued at least twice count).
+
+    Args:
+        rows: Result of ForecastArchive.query
+
+    Returns:
+        Dictionary with per-period arrays ('start', 'min_t', 'max_t', 'pop')
+        and scalar stats ('issuances', 'mean_high', 'mean_low', 'max_high',
+        'min_low', 'mean_pop', 'mean_revision')
+    """
+    if rows['start'].size == 0:
+        return {'start': rows['start'], 'issuances': 0}
+
+    # Sort by target period, then by issuance
+    order = np.lexsort((rows['issued'], rows['start']))
+    start = rows['start'][order]
+    boundary = start[1:] != start[:-1]
+    first = order[np.r_[True, boundary]]
+    last = order[np.r_[boundary, True]]
+
+    max_t, min_t, pop = rows['max_t'][last], rows['min_t'][last], rows['pop'][last]
+    # A period issued only once has first == last, which is not a revision
+    revised = first != last
+    revision = np.abs(rows['max_t'][last[revised]] - rows['max_t'][first[revised]])
+
+    return {
+        'start': rows['start'][last],
+        'min_t': min_t,
+        'max_t': max_t,
+        'pop': pop,
+        'issuances': int(np.unique(rows['issued']).size),
+        'mean_high': float(np.nanmean(max_t)) if np.isfinite(max_t).any() else np.nan,
+        'mean_low': float(np.nanmean(min_t)) if np.isfinite(min_t).any() else np.nan,
+        'max_high': float(np.nanmax(max_t)) if np.isfinite(max_t).any() else np.nan,
+        'min_low': float(np.nanmin(min_t)) if np.isfinite(min_t).any() else np.nan,
+        'mean_pop': float(np.nanmean(pop)) if np.isfinite(pop).any() else np.nan,
+        'mean_revision': float(np.nanmean(revision)) if np.isfinite(revision).any() else np.nan,
+    }
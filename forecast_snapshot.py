@@ -0,0 +1,288 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Tuple
+
+
+# Numeric elements stored in the snapshot value array (last axis)
+ELEMENTS = ('MinT', 'MaxT', 'PoP')
+MIN_T, MAX_T, POP = range(len(ELEMENTS))
+
+# F-C0032-001 is re-issued by CWA at these hours (Taiwan time)
+ISSUANCE_HOURS = (5, 11, 17, 23)
+
+# A new issuance usually shows up within this long after its nominal hour
+PUBLISH_GRACE = timedelta(hours=1)
+
+# Ranking metric -> (display name, unit, highest first)
+RANK_METRICS = {
+    'hottest': ('最高溫', '°C', True),
+    'coldest': ('最低溫', '°C', False),
+    'rainiest': ('降雨機率', '%', True),
+    'swing': ('日夜溫差', '°C', True),
+}
+
+
+def get_issuance_time(now: Optional[datetime] = None) -> datetime:
+    """
+    Get the most recent F-C0032-001 issuance time at or before `now`
+
+    Args:
+        now: Reference time (defaults to current Taiwan time)
+
+    Returns:
+        Timezone-aware issuance datetime (UTC+8)
+    """
+    taiwan_tz = timezone(timedelta(hours=8))
+    now = now or datetime.now(taiwan_tz)
+
+    for hour in reversed(ISSUANCE_HOURS):
+        if now.hour >= hour:
+            return now.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+    # Before the first issuance of the day - use yesterday's last one
+    yesterday = now - timedelta(days=1)
+    return yesterday.replace(hour=ISSUANCE_HOURS[-1], minute=0, second=0, microsecond=0)
+
+
+def _to_float(value: str) -> float:
+    """Convert an API parameter value to float (NaN if missing or non-numeric)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _format_value(value: float) -> str:
+    """Format an array value the way the API would print it ('N/A' for NaN)"""
+    return 'N/A' if np.isnan(value) else f"{value:g}"
+
+
+def _make_period(start_time_tw: datetime, end_time_tw: datetime) -> Dict:
+    """Period metadata shared by every county in a snapshot"""
+    return {
+        'start_time': start_time_tw,
+        'end_time': end_time_tw,
+        'description': f"{start_time_tw.strftime('%m/%d %H:%M')} - {end_time_tw.strftime('%m/%d %H:%M')}",
+    }
+
+
+class ForecastSnapshot:
+    """
+    All-county 36-hour forecast stored as NumPy arrays
+
+    - values:  float32 array of shape (county, period, element), elements in ELEMENTS order
+    - weather: str array of shape (county, period) with Wx descriptions
+    - comfort: str array of shape (county, period) with CI descriptions
+    """
+
+    def __init__(self, locations: List[str], periods: List[Dict], values: np.ndarray,
+                 weather: np.ndarray, comfort: np.ndarray, issued_at: datetime):
+        self.locations = locations
+        self.index = {name: idx for idx, name in enumerate(locations)}
+        self.periods = periods
+        self.values = values
+        self.weather = weather
+        self.comfort = comfort
+        self.issued_at = issued_at
+
+        # Filled in by WeatherService each time the snapshot is handed out
+        self.period_labels: List[str] = [p['description'] for p in periods]
+
+    @classmethod
+    def from_response(cls, data: dict, issued_at: datetime) -> Optional['ForecastSnapshot']:
+        """
+        Build a snapshot from a F-C0032-001 response that contains every county
+
+        Args:
+            data: Raw API response
+            issued_at: Issuance time the response belongs to
+
+        Returns:
+            ForecastSnapshot or None if the response is empty
+        """
+        records = data['records']['location']
+        if not records:
+            return None
+
+        num_periods = len(records[0]['weatherElement'][0]['time'])
+        values = np.full((len(records), num_periods, len(ELEMENTS)), np.nan, dtype=np.float32)
+        weather = np.full((len(records), num_periods), '', dtype=object)
+        comfort = np.full((len(records), num_periods), '', dtype=object)
+        locations = []
+
+        for loc_idx, loc in enumerate(records):
+            locations.append(loc['locationName'])
+
+            for element in loc['weatherElement']:
+                name = element['elementName']
+                params = [t['parameter']['parameterName'] for t in element['time'][:num_periods]]
+
+                if name in ELEMENTS:
+                    values[loc_idx, :len(params), ELEMENTS.index(name)] = [_to_float(p) for p in params]
+                elif name == 'Wx':
+                    weather[loc_idx, :len(params)] = params
+                elif name == 'CI':
+                    comfort[loc_idx, :len(params)] = params
+
+        # Period boundaries are shared by all counties
+        periods = []
+        for time_data in records[0]['weatherElement'][0]['time'][:num_periods]:
+            start_time_tw = datetime.strptime(time_data['startTime'], '%Y-%m-%d %H:%M:%S')
+            end_time_tw = datetime.strptime(time_data['endTime'], '%Y-%m-%d %H:%M:%S')
+            periods.append(_make_period(start_time_tw, end_time_tw))
+
+        return cls(locations, periods, values, weather, comfort, issued_at)
+
+    def same_forecast(self, other: 'ForecastSnapshot') -> Optional[bool]:
+        """
+        Check whether two snapshots carry the same forecast for the periods they share
+
+        Args:
+            other: Snapshot to compare against
+
+        Returns:
+            True or False, or None if the snapshots share no period
+        """
+        other_periods = {period['start_time']: idx for idx, period in enumerate(other.periods)}
+        shared = [
+            (idx, other_periods[period['start_time']])
+            for idx, period in enumerate(self.periods)
+            if period['start_time'] in other_periods
+        ]
+        if not shared:
+            return None
+        if set(self.locations) != set(other.locations):
+            return False
+
+        mine = [idx for idx, _ in shared]
+        theirs = [idx for _, idx in shared]
+        rows = [other.index[name] for name in self.locations]
+
+        return (
+            np.array_equal(self.values[:, mine], other.values[rows][:, theirs], equal_nan=True)
+            and bool((self.weather[:, mine] == other.weather[rows][:, theirs]).all())
+            and bool((self.comfort[:, mine] == other.comfort[rows][:, theirs]).all())
+        )
+
+    def scores(self, metric: str, num_periods: int = 2) -> np.ndarray:
+        """
+        Compute a per-county score for a ranking metric over the first periods
+
+        Args:
+            metric: One of RANK_METRICS
+            num_periods: Number of leading periods to consider (2 = the periods shown in /weather)
+
+        Returns:
+            float32 array of shape (county,), NaN where data is missing
+        """
+        window = self.values[:, :num_periods, :]
+
+        # fmax/fmin ignore NaN unless every period is missing
+        if metric == 'hottest':
+            return np.fmax.reduce(window[:, :, MAX_T], axis=1)
+        elif metric == 'coldest':
+            return np.fmin.reduce(window[:, :, MIN_T], axis=1)
+        elif metric == 'rainiest':
+            return np.fmax.reduce(window[:, :, POP], axis=1)
+        elif metric == 'swing':
+            return np.fmax.reduce(window[:, :, MAX_T], axis=1) - np.fmin.reduce(window[:, :, MIN_T], axis=1)
+
+        raise ValueError(f"未知的排行項目: {metric}")
+
+    def rank(self, metric: str, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Rank all counties by a metric
+
+        Args:
+            metric: One of RANK_METRICS
+            limit: Maximum number of results (None for all)
+
+        Returns:
+            List of (location, score) sorted best first, counties without data omitted
+        """
+        scores = self.scores(metric)
+        descending = RANK_METRICS[metric][2]
+
+        # argsort places NaN last in both directions since -NaN is still NaN
+        order = np.argsort(-scores if descending else scores, kind='stable')
+        order = order[~np.isnan(scores[order])][:limit]
+
+        return [(self.locations[idx], float(scores[idx])) for idx in order]
+
+    def compare(self, locations: List[str]) -> List[Dict]:
+        """
+        Extract side-by-side forecast data for several counties
+
+        Args:
+            locations: Location names (Chinese API format)
+
+        Returns:
+            List of {'location': str, 'periods': [period_data, ...]} in the requested order,
+            with period_data using the same keys as WeatherService.get_weather_forecast
+        """
+        idx = [self.index[location] for location in locations]
+        values = self.values[idx]
+
+        results = []
+        for row, location in enumerate(locations):
+            periods = []
+            for period_idx, period in enumerate(self.periods):
+                periods.append({
+                    'period_label': self.period_labels[period_idx],
+                    'description': period['description'],
+                    'weather_description': self.weather[idx[row], period_idx],
+                    'comfort': self.comfort[idx[row], period_idx],
+                    'low_temp': _format_value(values[row, period_idx, MIN_T]),
+                    'high_temp': _format_value(values[row, period_idx, MAX_T]),
+                    'pop': _format_value(values[row, period_idx, POP]),
+                })
+            results.append({'location': location, 'periods': periods})
+
+        return results
+
+    def save(self, path: str, **extra: str):
+        """
+        Save the snapshot to an .npz file
+
+        Args:
+            path: Destination file
+            **extra: Additional string metadata stored alongside the arrays
+        """
+        np.savez(
+            path,
+            locations=np.array(self.locations, dtype=str),
+            period_starts=np.array([p['start_time'].isoformat() for p in self.periods], dtype=str),
+            period_ends=np.array([p['end_time'].isoformat() for p in self.periods], dtype=str),
+            values=self.values,
+            weather=self.weather.astype(str),
+            comfort=self.comfort.astype(str),
+            issued_at=np.array(self.issued_at.isoformat()),
+            **{f"extra_{key}": np.array(value) for key, value in extra.items()}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['ForecastSnapshot', Dict[str, str]]:
+        """
+        Load a snapshot saved with `save`
+
+        Returns:
+            Tuple of (snapshot, extra metadata)
+        """
+        with np.load(path) as data:
+            periods = []
+            for start, end in zip(data['period_starts'], data['period_ends']):
+                start_time_tw = datetime.fromisoformat(str(start))
+                end_time_tw = datetime.fromisoformat(str(end))
+                periods.append(_make_period(start_time_tw, end_time_tw))
+
+            snapshot = cls(
+                [str(name) for name in data['locations']],
+                periods,
+                data['values'],
+                data['weather'].astype(object),
+                data['comfort'].astype(object),
+                datetime.fromisoformat(str(data['issued_at'])),
+            )
+            extra = {key[len('extra_'):]: str(data[key]) for key in data.files if key.startswith('extra_')}
+
+        return snapshot, extra
@@ -1,18 +1,24 @@
 import google.generativeai as genai
 import os
 from typing import Dict, Optional
+from transport import Transport, create_transport
 
 
 class GeminiService:
     """Service to generate weather-based suggestions using Gemini AI"""
 
-    def __init__(self):
+    def __init__(self, transport: Optional[Transport] = None):
+        # Gemini calls go through the transport (live, record or replay)
+        self.transport = transport or create_transport()
+
         self.api_key = os.getenv('GEMINI_API_KEY')
-        if not self.api_key:
+        if not self.api_key and not self.transport.offline:
             raise ValueError("請設定 GEMINI_API_KEY 環境變數")
 
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        self.model_name = 'gemini-2.5-flash'
+        self.model = genai.GenerativeModel(self.model_name)
 
     async def get_weather_suggestions(self, location: str, weather_data: Dict) -> Optional[str]:
         """
@@ -88,51 +94,30 @@ class GeminiService:
 
     async def _generate_async(self, prompt: str) -> str:
         """Generate response asynchronously"""
-        import asyncio
-
         try:
-            # Run the synchronous Gemini API call in a thread pool
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.7,
-                        top_p=0.9,
-                        top_k=40,
-                        max_output_tokens=2000,  # Increased for longer responses
-                    )
-                )
+            result = await self.transport.call(
+                'gemini',
+                {'model': self.model_name, 'prompt': prompt},
+                lambda: self._generate_live(prompt)
             )
 
             # Check if response has valid content
-            if not response.candidates:
+            if not result['candidates']:
                 print("Gemini: No candidates returned")
                 return "無法生成建議，請稍後再試。"
 
-            candidate = response.candidates[0]
-
             # Check finish reason
             # 1 = STOP (success), 2 = MAX_TOKENS, 3 = SAFETY, 4 = RECITATION, 5 = OTHER
-            if candidate.finish_reason == 3:  # SAFETY
+            if result['finish_reason'] == 3:  # SAFETY
                 print("Gemini: Response blocked by safety filters")
                 return "抱歉，無法為此天氣生成建議。"
 
-            if candidate.finish_reason == 2:  # MAX_TOKENS
+            if result['finish_reason'] == 2:  # MAX_TOKENS
                 print("Gemini: Response truncated (max tokens)")
                 # Still try to return partial response
 
-            # Try to get text from response
-            try:
-                if response.text:
-                    return response.text.strip()
-            except ValueError:
-                # response.text failed, try to extract from parts
-                if candidate.content and candidate.content.parts:
-                    text_parts = [part.text for part in candidate.content.parts if hasattr(part, 'text')]
-                    if text_parts:
-                        return ''.join(text_parts).strip()
+            if result['text']:
+                return result['text']
 
             return "無法生成建議，請稍後再試。"
 
@@ -141,6 +126,53 @@ class GeminiService:
             # Return simple suggestion as fallback
             return None  # Signal to use fallback
 
+    async def _generate_live(self, prompt: str) -> Dict:
+        """
+        Call the Gemini API and reduce the response to a serializable dict
+
+        Returns:
+            {'candidates': int, 'finish_reason': int or None, 'text': str or None}
+        """
+        import asyncio
+
+        # Run the synchronous Gemini API call in a thread pool
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            None,
+            lambda: self.model.generate_content(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.7,
+                    top_p=0.9,
+                    top_k=40,
+                    max_output_tokens=2000,  # Increased for longer responses
+                )
+            )
+        )
+
+        if not response.candidates:
+            return {'candidates': 0, 'finish_reason': None, 'text': None}
+
+        candidate = response.candidates[0]
+        text = None
+
+        # Try to get text from response
+        try:
+            if response.text:
+                text = response.text.strip()
+        except ValueError:
+            # response.text failed, try to extract from parts
+            if candidate.content and candidate.content.parts:
+                text_parts = [part.text for part in candidate.content.parts if hasattr(part, 'text')]
+                if text_parts:
+                    text = ''.join(text_parts).strip()
+
+        return {
+            'candidates': len(response.candidates),
+            'finish_reason': int(candidate.finish_reason),
+            'text': text,
+        }
+
     def get_simple_suggestion(self, weather_data: Dict) -> str:
         """
         Fallback method to provide simple suggestions without AI
@@ -0,0 +1,48 @@
+from aiohttp import web
+from typing import Callable, Dict
+
+
+class HealthServer:
+    """
+    Small local HTTP server for container health checks
+
+    GET /live  - 200 while the process is running
+    GET /ready - 200 once the bot is connected and its caches are warm, 503 otherwise
+
+    Extra JSON endpoints (e.g. scheduler stats) can be added with add_json_route.
+    """
+
+    def __init__(self, host: str, port: int, is_ready: Callable[[], bool]):
+        self.host = host
+        self.port = port
+        self.is_ready = is_ready
+        self.app = web.Application()
+        self.app.router.add_get('/live', self._live)
+        self.app.router.add_get('/ready', self._ready)
+        self.runner = None
+
+    def add_json_route(self, path: str, handler: Callable[[], Dict]):
+        """Expose the result of `handler()` as JSON at `path`"""
+        async def route(request):
+            return web.json_response(handler())
+
+        self.app.router.add_get(path, route)
+
+    async def _live(self, request):
+        return web.Response(text="ok")
+
+    async def _ready(self, request):
+        if self.is_ready():
+            return web.Response(text="ready")
+        return web.Response(status=503, text="not ready")
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        print(f"Health server listening on http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
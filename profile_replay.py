@@ -0,0 +1,45 @@
+"""
+Profile the forecast pipeline offline against recorded CWA/Gemini traffic
+
+Record fixtures once with TRANSPORT_MODE=record, then run:
+
+    python profile_replay.py 臺北市 高雄市 --iterations 50
+
+Set TRANSPORT_REPLAY_TIMING=1 to include the recorded upstream latency.
+"""
+import argparse
+import asyncio
+import cProfile
+import os
+import pstats
+
+# Must be set before the services are created on import of bot
+os.environ.setdefault('TRANSPORT_MODE', 'replay')
+
+from bot import client, create_weather_embed
+
+
+async def run(locations, iterations):
+    for _ in range(iterations):
+        for location in locations:
+            await create_weather_embed(location, client.weather_service, client.gemini_service)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile create_weather_embed against replayed fixtures")
+    parser.add_argument('locations', nargs='*', default=['臺北市'])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--sort', default='cumulative')
+    parser.add_argument('--limit', type=int, default=30)
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    asyncio.run(run(args.locations, args.iterations))
+    profiler.disable()
+
+    pstats.Stats(profiler).sort_stats(args.sort).print_stats(args.limit)
+
+
+if __name__ == "__main__":
+    main()
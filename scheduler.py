@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Callable, Awaitable, Any
+
+
+# Traffic classes, highest priority first
+INTERACTIVE = 'interactive'  # A user is waiting for the answer
+SCHEDULED = 'scheduled'      # Fan-out on a schedule (subscriptions, alerts)
+BACKGROUND = 'background'    # Cache refreshes nobody is waiting for
+PRIORITY_CLASSES = (INTERACTIVE, SCHEDULED, BACKGROUND)
+
+# Weighted fair queuing shares when every class has work queued
+DEFAULT_WEIGHTS = {INTERACTIVE: 8, SCHEDULED: 3, BACKGROUND: 1}
+
+# Class of the outbound calls made by the current task (interactive unless set)
+current_priority: ContextVar[str] = ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(name: str):
+    """Run the enclosed outbound calls under the given traffic class"""
+    token = current_priority.set(name)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class _Job:
+    __slots__ = ('func', 'future', 'priority', 'finish_tag', 'start_tag', 'enqueued_at', 'task')
+
+    def __init__(self, func, future, priority, start_tag, finish_tag):
+        self.func = func
+        self.future = future
+        self.priority = priority
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.perf_counter()
+        self.task = None
+
+
+class UpstreamScheduler:
+    """
+    Central scheduler for every outbound CWA and Gemini call
+
+    At most `max_concurrency` calls run at once. Queued calls are dispatched
+    by weighted fair queuing across the traffic classes. Once
+    `preempt_threshold` interactive calls are waiting, background calls are
+    held back, and running ones are cancelled and requeued. Background calls
+    must therefore be safe to retry, which holds for the idempotent GETs
+    used for refreshes.
+    """
+
+    def __init__(self, max_concurrency: int = 4, weights: Dict[str, int] = None, preempt_threshold: int = 2):
+        self.max_concurrency = max_concurrency
+        self.weights = weights or DEFAULT_WEIGHTS
+        self.preempt_threshold = preempt_threshold
+
+        self.queues: Dict[str, deque] = {name: deque() for name in PRIORITY_CLASSES}
+        self.running: Dict[str, set] = {name: set() for name in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+        self._last_finish = {name: 0.0 for name in PRIORITY_CLASSES}
+
+        # Recent queue wait times (seconds) and counters per class
+        self._waits = {name: deque(maxlen=1000) for name in PRIORITY_CLASSES}
+        self._counters = {name: {'submitted': 0, 'completed': 0, 'preempted': 0} for name in PRIORITY_CLASSES}
+
+    async def submit(self, func: Callable[[], Awaitable[Any]], priority_class: str = None) -> Any:
+        """
+        Queue an outbound call and wait for its result
+
+        Args:
+            func: Coroutine function performing the call (may be retried if preempted)
+            priority_class: Traffic class (defaults to the current context's class)
+
+        Returns:
+            Whatever `func` returns
+        """
+        priority_class = priority_class or current_priority.get()
+
+        # Start-time fair queuing tags
+        start_tag = max(self._virtual_time, self._last_finish[priority_class])
+        finish_tag = start_tag + 1.0 / self.weights[priority_class]
+        self._last_finish[priority_class] = finish_tag
+
+        job = _Job(func, asyncio.get_running_loop().create_future(), priority_class, start_tag, finish_tag)
+        self.queues[priority_class].append(job)
+        self._counters[priority_class]['submitted'] += 1
+        self._pump()
+
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            # Caller gave up - drop the job wherever it is
+            if job.task is not None:
+                job.task.cancel()
+            raise
+
+    def _interactive_backlog(self) -> int:
+        return sum(1 for job in self.queues[INTERACTIVE] if not job.future.done())
+
+    def _pump(self):
+        """Start queued jobs while there are free slots"""
+        backlog = self._interactive_backlog()
+        if backlog >= self.preempt_threshold:
+            self._preempt_background()
+
+        while sum(len(jobs) for jobs in self.running.values()) < self.max_concurrency:
+            job = self._next_job(hold_background=backlog >= self.preempt_threshold)
+            if job is None:
+                return
+
+            self._virtual_time = max(self._virtual_time, job.start_tag)
+            self._waits[job.priority].append(time.perf_counter() - job.enqueued_at)
+            self.running[job.priority].add(job)
+            job.task = asyncio.ensure_future(self._run(job))
+
+    def _next_job(self, hold_background: bool):
+        """Pop the queued job with the smallest finish tag"""
+        best = None
+        for name in PRIORITY_CLASSES:
+            if hold_background and name == BACKGROUND:
+                continue
+
+            queue = self.queues[name]
+            # Skip jobs whose caller already gave up
+            while queue and queue[0].future.done():
+                queue.popleft()
+
+            if queue and (best is None or queue[0].finish_tag < best.finish_tag):
+                best = queue[0]
+
+        if best is not None:
+            self.queues[best.priority].popleft()
+        return best
+
+    def _preempt_background(self):
+        """Cancel running background jobs and put them back at the head of their queue"""
+        for job in list(self.running[BACKGROUND]):
+            job.task.cancel()
+            self.running[BACKGROUND].discard(job)
+            job.task = None
+            job.enqueued_at = time.perf_counter()
+            self.queues[BACKGROUND].appendleft(job)
+            self._counters[BACKGROUND]['preempted'] += 1
+
+    async def _run(self, job: _Job):
+        task = asyncio.current_task()
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            # Preempted (already requeued) or abandoned by the caller
+            return
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            # A preempted job may already be running again under a new task
+            if job.task is task:
+                job.task = None
+                self.running[job.priority].discard(job)
+                self._counters[job.priority]['completed'] += 1
+            self._pump()
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Per-class queue statistics
+
+        Returns:
+            {class: {'queued', 'running', 'submitted', 'completed', 'preempted',
+                     'wait_mean_ms', 'wait_p95_ms', 'wait_max_ms'}}
+        """
+        result = {}
+        for name in PRIORITY_CLASSES:
+            waits = sorted(self._waits[name])
+            result[name] = {
+                'queued': sum(1 for job in self.queues[name] if not job.future.done()),
+                'running': len(self.running[name]),
+                **self._counters[name],
+                'wait_mean_ms': round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                'wait_p95_ms': round(1000 * waits[round(0.95 * (len(waits) - 1))], 2) if waits else 0.0,
+                'wait_max_ms': round(1000 * waits[-1], 2) if waits else 0.0,
+            }
+        return result
@@ -0,0 +1,262 @@
+import heapq
+import math
+import numpy as np
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+
+
+# Equirectangular projection centred on Taiwan: degrees -> km
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320 * math.cos(math.radians(23.7))
+
+# CWA uses -99 (and lower) for missing observations
+MISSING_VALUE = -99
+
+# Rough bounding box that covers Taiwan and the outlying islands
+LAT_RANGE = (21.5, 26.5)
+LON_RANGE = (118.0, 122.5)
+
+
+def _project(lat, lon) -> np.ndarray:
+    """Project WGS84 coordinates to planar km so Euclidean distance is meaningful"""
+    return np.column_stack((np.asarray(lon) * KM_PER_DEG_LON, np.asarray(lat) * KM_PER_DEG_LAT))
+
+
+def _to_float(value) -> float:
+    """Convert an observation to float (NaN if missing)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return np.nan if value <= MISSING_VALUE else value
+
+
+class KDTree:
+    """
+    Static 2-D KD-tree
+
+    Built once per refresh by median splits; nearest-neighbour queries visit
+    O(log n) nodes on average.
+    """
+
+    def __init__(self, points: np.ndarray):
+        count = len(points)
+        self._point = [0] * count
+        self._axis = [0] * count
+        self._left = [-1] * count
+        self._right = [-1] * count
+        self._coords = [tuple(p) for p in points.tolist()]
+        self._next = 0
+        self._root = self._build(points, np.arange(count), 0)
+
+    def _build(self, points: np.ndarray, idx: np.ndarray, depth: int) -> int:
+        if idx.size == 0:
+            return -1
+
+        axis = depth % 2
+        idx = idx[np.argsort(points[idx, axis], kind='stable')]
+        mid = idx.size // 2
+
+        node = self._next
+        self._next += 1
+        self._point[node] = int(idx[mid])
+        self._axis[node] = axis
+        self._left[node] = self._build(points, idx[:mid], depth + 1)
+        self._right[node] = self._build(points, idx[mid + 1:], depth + 1)
+        return node
+
+    def query(self, point: Tuple[float, float], k: int = 1) -> List[Tuple[float, int]]:
+        """
+        Find the k nearest points
+
+        Args:
+            point: Query point in the same (projected) space as the tree
+            k: Number of neighbours
+
+        Returns:
+            List of (distance, point index), nearest first
+        """
+        best = []  # Max-heap of (-squared distance, index)
+
+        def visit(node: int):
+            if node < 0:
+                return
+
+            idx = self._point[node]
+            px, py = self._coords[idx]
+            dist2 = (px - point[0]) ** 2 + (py - point[1]) ** 2
+            if len(best) < k:
+                heapq.heappush(best, (-dist2, idx))
+            elif dist2 < -best[0][0]:
+                heapq.heapreplace(best, (-dist2, idx))
+
+            diff = point[self._axis[node]] - self._coords[idx][self._axis[node]]
+            near, far = (self._left[node], self._right[node]) if diff < 0 else (self._right[node], self._left[node])
+            visit(near)
+
+            # Only cross the split plane if it is closer than the current k-th best
+            if len(best) < k or diff * diff < -best[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return sorted((math.sqrt(-neg), idx) for neg, idx in best)
+
+
+class StationIndex:
+    """
+    Latest station observations with a spatial index
+
+    Combines the automatic weather stations (O-A0001-001) with the staffed
+    stations (O-A0003-001). Observations are stored column-wise in NumPy
+    arrays; only stations that report a temperature are indexed.
+    """
+
+    def __init__(self, stations: Dict[str, np.ndarray], observed_at: Optional[datetime]):
+        self.stations = stations
+        self.observed_at = observed_at
+
+        reporting = np.flatnonzero(~np.isnan(stations['temperature']))
+        self._reporting = reporting
+        self._tree = KDTree(_project(stations['lat'][reporting], stations['lon'][reporting]))
+
+        # Township / county centroids of the stations, used to look up names
+        # when no township table is available (see `resolve`)
+        self.places: Dict[str, Tuple[float, float]] = {}
+        groups: Dict[str, List[int]] = {}
+        for idx, (county, town) in enumerate(zip(stations['county'], stations['town'])):
+            groups.setdefault(county, []).append(idx)
+            groups.setdefault(f"{county} {town}", []).append(idx)
+        for name, members in groups.items():
+            self.places[name] = (
+                float(stations['lat'][members].mean()),
+                float(stations['lon'][members].mean()),
+            )
+
+    def __len__(self) -> int:
+        return len(self._reporting)
+
+    @classmethod
+    def from_response(cls, *responses: dict) -> Optional['StationIndex']:
+        """
+        Build the index from one or more station observation responses
+
+        Args:
+            *responses: Raw O-A0001-001 / O-A0003-001 responses (a station listed
+                in several is kept once)
+
+        Returns:
+            StationIndex or None if no station has usable coordinates
+        """
+        rows = []
+        seen = set()
+        for data in responses:
+            for station in data['records']['Station']:
+                station_id = station.get('StationId', '')
+                if station_id in seen:
+                    continue
+
+                geo = station.get('GeoInfo', {})
+                coords = next(
+                    (c for c in geo.get('Coordinates', []) if c.get('CoordinateName') == 'WGS84'),
+                    None
+                )
+                if not coords:
+                    continue
+                seen.add(station_id)
+
+                element = station.get('WeatherElement', {})
+                rows.append((
+                    station_id,
+                    station.get('StationName', ''),
+                    geo.get('CountyName', ''),
+                    geo.get('TownName', ''),
+                    _to_float(coords.get('StationLatitude')),
+                    _to_float(coords.get('StationLongitude')),
+                    station.get('ObsTime', {}).get('DateTime', ''),
+                    element.get('Weather', ''),
+                    _to_float(element.get('AirTemperature')),
+                    _to_float(element.get('RelativeHumidity')),
+                    _to_float(element.get('WindSpeed')),
+                    _to_float(element.get('Now', {}).get('Precipitation')),
+                ))
+
+        rows = [row for row in rows if not (np.isnan(row[4]) or np.isnan(row[5]))]
+        if not rows:
+            return None
+
+        columns = list(zip(*rows))
+        stations = {
+            'id': np.array(columns[0], dtype=object),
+            'name': np.array(columns[1], dtype=object),
+            'county': np.array(columns[2], dtype=object),
+            'town': np.array(columns[3], dtype=object),
+            'lat': np.array(columns[4], dtype=np.float64),
+            'lon': np.array(columns[5], dtype=np.float64),
+            'obs_time': np.array(columns[6], dtype=object),
+            'weather': np.array(columns[7], dtype=object),
+            'temperature': np.array(columns[8], dtype=np.float32),
+            'humidity': np.array(columns[9], dtype=np.float32),
+            'wind_speed': np.array(columns[10], dtype=np.float32),
+            'precipitation': np.array(columns[11], dtype=np.float32),
+        }
+
+        observed = [t for t in columns[6] if t]
+        observed_at = datetime.fromisoformat(max(observed)) if observed else None
+
+        return cls(stations, observed_at)
+
+    def resolve(self, query: str, places: Optional[Dict[str, Tuple[float, float]]] = None) -> Optional[Tuple[float, float, str]]:
+        """
+        Resolve a township, county or "lat,lon" string to coordinates
+
+        Args:
+            query: e.g. "臺北市 大安區", "大安區", "臺北市" or "25.03,121.56"
+            places: Township/county coordinate table ("縣市 鄉鎮區" -> (lat, lon));
+                defaults to the centroids of the indexed stations
+
+        Returns:
+            Tuple of (lat, lon, display name) or None if not found
+        """
+        places = places or self.places
+        query = query.strip().replace('台', '臺')
+
+        parts = query.replace('，', ',').split(',')
+        if len(parts) == 2:
+            lat, lon = _to_float(parts[0]), _to_float(parts[1])
+            if LAT_RANGE[0] <= lat <= LAT_RANGE[1] and LON_RANGE[0] <= lon <= LON_RANGE[1]:
+                return lat, lon, f"{lat:.4f}, {lon:.4f}"
+            return None
+
+        name = ' '.join(query.split())
+        if name in places:
+            return (*places[name], name)
+
+        # Bare township name - only accept it if it is unambiguous
+        matches = [place for place in places if place.endswith(f" {name}")]
+        if len(matches) == 1:
+            return (*places[matches[0]], matches[0])
+
+        return None
+
+    def nearest(self, lat: float, lon: float, k: int = 3) -> List[Dict]:
+        """
+        Find the nearest reporting stations
+
+        Args:
+            lat: Latitude (WGS84)
+            lon: Longitude (WGS84)
+            k: Number of stations
+
+        Returns:
+            List of station dicts (all observation fields plus 'distance' in km), nearest first
+        """
+        point = tuple(_project([lat], [lon])[0])
+
+        results = []
+        for distance, tree_idx in self._tree.query(point, k):
+            idx = self._reporting[tree_idx]
+            station = {name: column[idx] for name, column in self.stations.items()}
+            station['distance'] = distance
+            results.append(station)
+
+        return results
@@ -0,0 +1,209 @@
+import aiohttp
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Optional, Dict, Tuple, Callable, Awaitable
+
+
+# Request parameters that never take part in fixture matching.
+# Authorization is a secret; the time window changes with every run.
+IGNORED_PARAMS = {'Authorization', 'timeFrom', 'timeTo'}
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when no recorded response matches a request"""
+
+
+def _fixture_key(name: str, request: Dict) -> str:
+    """Stable key for a request (hash of its JSON form)"""
+    payload = json.dumps({'name': name, 'request': request}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class Transport:
+    """
+    Live transport: every call goes straight to the upstream API
+
+    Services send all outbound traffic through `get_json` (CWA) or `call`
+    (anything else, e.g. Gemini), which lets subclasses record or replay it
+    and lets attached schedulers prioritize it. Responses passed through
+    `call` must be JSON-serializable.
+    """
+
+    mode = 'live'
+    offline = False  # True if no API keys are needed
+
+    # Optional {call name: UpstreamScheduler}; each upstream is queued through its own
+    # scheduler so slow calls to one (Gemini) never use up the budget of another (CWA)
+    schedulers = None
+
+    async def call(self, name: str, request: Dict, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        """
+        Perform an outbound call
+
+        Args:
+            name: Kind of call ('http', 'gemini', ...)
+            request: JSON-serializable description of the request
+            func: Coroutine function that performs the real call
+
+        Returns:
+            JSON-serializable response
+        """
+        scheduler = (self.schedulers or {}).get(name)
+        if scheduler is None:
+            return await self._perform(name, request, func)
+        return await scheduler.submit(lambda: self._perform(name, request, func))
+
+    async def _perform(self, name: str, request: Dict, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Carry out a call; subclasses override this to record or replay"""
+        return await func()
+
+    async def get_json(self, url: str, params: Dict) -> Tuple[int, Optional[dict]]:
+        """
+        GET a JSON API endpoint
+
+        Args:
+            url: Endpoint URL
+            params: Query parameters
+
+        Returns:
+            Tuple of (HTTP status, parsed JSON or None if status != 200)
+        """
+        request = {
+            'url': url,
+            'params': {k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+        }
+
+        async def fetch():
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, params=params) as response:
+                    if response.status != 200:
+                        return {'status': response.status, 'body': None}
+                    return {'status': response.status, 'body': await response.json()}
+
+        result = await self.call('http', request, fetch)
+        return result['status'], result['body']
+
+
+class RecordingTransport(Transport):
+    """Live transport that also writes every request/response pair to a fixture file"""
+
+    mode = 'record'
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    async def _perform(self, name: str, request: Dict, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        started = time.perf_counter()
+        response = await func()
+        elapsed = time.perf_counter() - started
+
+        fixture = {
+            'name': name,
+            'request': request,
+            'response': response,
+            'elapsed': elapsed,
+            'recorded_at': time.time(),
+        }
+        path = os.path.join(self.directory, f"{name}-{_fixture_key(name, request)}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, ensure_ascii=False)
+
+        return response
+
+
+class ReplayTransport(Transport):
+    """
+    Serve recorded responses from disk without touching the network
+
+    Requests are matched exactly first. Unless `strict`, a request without
+    an exact match falls back to the latest recording of the same route, so
+    prompts that embed the current date still replay. Only Gemini prompts and
+    the ignored CWA parameters (IGNORED_PARAMS) may drift this way.
+    """
+
+    mode = 'replay'
+    offline = True
+
+    def __init__(self, directory: str, use_timing: bool = False, strict: bool = False):
+        self.directory = directory
+        self.use_timing = use_timing
+        self.strict = strict
+        self.fixtures: Dict[str, Dict] = {}
+        self.latest_by_route: Dict[Tuple[str, str], Dict] = {}
+        self._load()
+
+    def _load(self):
+        """Load every fixture file into memory"""
+        if not os.path.isdir(self.directory):
+            print(f"Replay fixtures directory not found: {self.directory}")
+            return
+
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+                fixture = json.load(f)
+
+            self.fixtures[_fixture_key(fixture['name'], fixture['request'])] = fixture
+
+            route = (fixture['name'], self._route(fixture['request']))
+            latest = self.latest_by_route.get(route)
+            if latest is None or fixture['recorded_at'] > latest['recorded_at']:
+                self.latest_by_route[route] = fixture
+
+        print(f"Loaded {len(self.fixtures)} replay fixtures from {self.directory}")
+
+    @staticmethod
+    def _route(request: Dict) -> str:
+        """
+        Fallback key of a request
+
+        HTTP requests keep every recorded parameter, so a single-county request
+        never replays another county's (or the all-county) response. Other calls
+        match on the model alone.
+        """
+        if 'url' in request:
+            return json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return request.get('model') or ''
+
+    async def _perform(self, name: str, request: Dict, func: Callable[[], Awaitable[Dict]]) -> Dict:
+        fixture = self.fixtures.get(_fixture_key(name, request))
+        if fixture is None and not self.strict:
+            fixture = self.latest_by_route.get((name, self._route(request)))
+        if fixture is None:
+            raise ReplayMissError(f"找不到對應的錄製資料: {name} {self._route(request)}")
+
+        if self.use_timing:
+            await asyncio.sleep(fixture['elapsed'])
+
+        return fixture['response']
+
+
+def create_transport() -> Transport:
+    """
+    Create the transport selected by the environment
+
+    TRANSPORT_MODE:          live (default), record or replay
+    TRANSPORT_FIXTURES_DIR:  fixture directory (default: fixtures)
+    TRANSPORT_REPLAY_TIMING: set to 1 to replay with recorded latency
+    TRANSPORT_REPLAY_STRICT: set to 1 to require exact request matches
+    """
+    mode = os.getenv('TRANSPORT_MODE', 'live').lower()
+    directory = os.getenv('TRANSPORT_FIXTURES_DIR', 'fixtures')
+
+    if mode == 'live':
+        return Transport()
+    elif mode == 'record':
+        return RecordingTransport(directory)
+    elif mode == 'replay':
+        return ReplayTransport(
+            directory,
+            use_timing=os.getenv('TRANSPORT_REPLAY_TIMING') == '1',
+            strict=os.getenv('TRANSPORT_REPLAY_STRICT') == '1',
+        )
+
+    raise ValueError(f"無效的 TRANSPORT_MODE: {mode}")
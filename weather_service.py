@@ -1,20 +1,57 @@
-import aiohttp
+import asyncio
 import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
+from forecast_snapshot import ForecastSnapshot, get_issuance_time, PUBLISH_GRACE
+from forecast_archive import ForecastArchive
+from transport import Transport, create_transport
+from station_index import StationIndex
+from week_forecast import WeekForecast, WEEKLY_DATASETS
+from scheduler import PRIORITY_CLASSES, current_priority
+
+
+# Once an issuance is PUBLISH_GRACE late, keep polling for it but less often
+LATE_RECHECK_INTERVAL = timedelta(minutes=30)
 
 
 class WeatherService:
     """Service to fetch weather data from Taiwan CWA OpenData API"""
 
-    def __init__(self):
+    def __init__(self, transport: Optional[Transport] = None):
+        # All CWA requests go through the transport (live, record or replay)
+        self.transport = transport or create_transport()
+
         self.api_key = os.getenv('CWA_API_KEY')
-        if not self.api_key:
+        if not self.api_key and not self.transport.offline:
             raise ValueError("請設定 CWA_API_KEY 環境變數")
 
         # CWA OpenData API endpoint for 36-hour weather forecast
         self.base_url = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-C0032-001"
 
+        # All-county snapshot, cached per (issuance, forecast window). The issuance
+        # is None until the content is known to belong to one (see _accept_snapshot)
+        self._snapshot: Optional[ForecastSnapshot] = None
+        self._snapshot_key: Optional[Tuple] = None
+        self._snapshot_seen_at: Optional[datetime] = None  # Last fetch that returned the cached content
+        self._snapshot_checked_at: Optional[datetime] = None  # Last re-check for a new issuance
+        self._snapshot_fetched_at = 0.0  # Start (time.monotonic) of the fetch last applied
+        self._snapshot_fetches: Dict[str, Tuple[str, asyncio.Task]] = {}  # class -> (time_from, task)
+
+        # Every fetched snapshot is appended to the local monthly archive
+        self.archive = ForecastArchive(os.getenv('FORECAST_ARCHIVE_DIR', 'data/archive'))
+
+        # Automatic (O-A0001-001) and staffed (O-A0003-001) station observations,
+        # bulk-refreshed and shared by all requests
+        self.observation_urls = (
+            "https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0001-001",
+            "https://opendata.cwa.gov.tw/api/v1/rest/datastore/O-A0003-001",
+        )
+        self.stations: Optional[StationIndex] = None
+
+        # Seven-day township forecast for all of Taiwan, bulk-refreshed as typed arrays
+        self.week: Optional[WeekForecast] = None
+
     async def get_weather_forecast(self, location: str) -> Optional[Dict]:
         """
         Fetch weather forecast for a specific location in Taiwan
@@ -25,6 +62,324 @@ class WeatherService:
         Returns:
             Dictionary containing weather data or None if not found
         """
+        time_from, time_to = self._get_time_range()
+
+        params = {
+            'Authorization': self.api_key,
+            'locationName': location,
+            'timeFrom': time_from,
+            'timeTo': time_to
+        }
+
+        try:
+            status, data = await self.transport.get_json(self.base_url, params)
+            if status != 200:
+                print(f"API Error: Status {status}")
+                return None
+
+            if not data.get('success'):
+                print(f"API returned success=False")
+                return None
+
+            # Parse the weather data
+            return self._parse_weather_data(data, location)
+
+        except Exception as e:
+            print(f"Error fetching weather data: {e}")
+            return None
+
+    async def get_forecast_snapshot(self) -> Optional[ForecastSnapshot]:
+        """
+        Get the forecast for every county as a single array-backed snapshot
+
+        One API request covers all 22 counties. The cached snapshot is served
+        as long as it covers the current period window; new issuances are
+        picked up by `refresh_snapshot`, so callers never wait on a re-check.
+
+        Returns:
+            ForecastSnapshot or None if the data could not be fetched
+        """
+        time_from, time_to = self._get_time_range()
+        if not self._snapshot_current(time_from):
+            await self._fetch_snapshot_shared(time_from, time_to)
+            if not self._snapshot_current(time_from):
+                return None
+
+        # Labels are relative to the current date, so refresh them on every use
+        self._snapshot.period_labels = [
+            self._get_period_label(period['start_time']) for period in self._snapshot.periods
+        ]
+        return self._snapshot
+
+    async def refresh_snapshot(self) -> bool:
+        """
+        Fetch the snapshot again if a new issuance or period window is due
+
+        CWA publishes some time after the nominal issuance hour, so this keeps
+        re-checking until the content changes: on every call at first, then
+        every LATE_RECHECK_INTERVAL once the issuance is PUBLISH_GRACE late.
+
+        Returns:
+            True if a snapshot for the current window is cached
+        """
+        time_from, time_to = self._get_time_range()
+        now = datetime.now(timezone(timedelta(hours=8)))
+        issuance = get_issuance_time(now)
+
+        if self._snapshot_current(time_from):
+            if self._snapshot_key[0] == issuance:
+                return True
+            late = now - issuance >= PUBLISH_GRACE
+            if late and self._snapshot_checked_at and now - self._snapshot_checked_at < LATE_RECHECK_INTERVAL:
+                return True
+
+        self._snapshot_checked_at = now
+        await self._fetch_snapshot_shared(time_from, time_to)
+        return self._snapshot_current(time_from)
+
+    def _snapshot_current(self, time_from: str) -> bool:
+        """Whether the cached snapshot covers the given period window"""
+        return self._snapshot is not None and self._snapshot_key[1] == time_from
+
+    async def _fetch_snapshot_shared(self, time_from: str, time_to: str):
+        """
+        Fetch the snapshot, joining an in-flight fetch of the same or a higher traffic class
+
+        A caller never waits on a fetch queued below its own class: an
+        interactive request that arrives while a background refresh is held
+        back by the scheduler starts its own interactive fetch instead.
+        """
+        rank = PRIORITY_CLASSES.index(current_priority.get())
+        for name, (fetch_time_from, task) in self._snapshot_fetches.items():
+            if fetch_time_from == time_from and PRIORITY_CLASSES.index(name) <= rank:
+                break
+        else:
+            # The task inherits the caller's context, and with it the traffic class
+            name = current_priority.get()
+            task = asyncio.create_task(self._fetch_and_accept(time_from, time_to))
+            self._snapshot_fetches[name] = (time_from, task)
+
+            def forget(done: asyncio.Task):
+                if self._snapshot_fetches.get(name, (None, None))[1] is done:
+                    del self._snapshot_fetches[name]
+
+            task.add_done_callback(forget)
+
+        # Shielded so one caller giving up does not cancel the fetch for the others
+        await asyncio.shield(task)
+
+    async def _fetch_and_accept(self, time_from: str, time_to: str):
+        """Fetch all counties and cache the result (unless a newer fetch already landed)"""
+        started = time.monotonic()
+        now = datetime.now(timezone(timedelta(hours=8)))
+        issuance = get_issuance_time(now)
+
+        snapshot = await self._fetch_snapshot(time_from, time_to, issuance)
+        if snapshot is None or started < self._snapshot_fetched_at:
+            return
+
+        self._snapshot_fetched_at = started
+        self._accept_snapshot(snapshot, issuance, time_from, now)
+
+    def _accept_snapshot(self, snapshot: ForecastSnapshot, issuance: datetime, time_from: str, now: datetime):
+        """
+        Work out which issuance a fetched snapshot belongs to, then cache and archive it
+
+        CWA publishes some time after the nominal issuance hour, so the clock
+        alone cannot tell a new forecast from the previous one. Unchanged
+        content keeps the issuance it already had, however late the new one
+        is. Changed content is attributed to `issuance` only if the previous
+        content was still being served after the previous issuance was due.
+        Anything else (cold start, stale cache) is served but not archived
+        until a later change pins its issuance down.
+        """
+        previous = self._snapshot
+        previous_issuance = get_issuance_time(issuance - timedelta(seconds=1))
+        same = previous.same_forecast(snapshot) if previous is not None else None
+        seen_recently = self._snapshot_seen_at is not None and self._snapshot_seen_at >= previous_issuance
+
+        if same:
+            issued_at, attributed = previous.issued_at, self._snapshot_key[0] is not None
+        elif same is False and seen_recently:
+            issued_at, attributed = issuance, True
+        else:
+            # Best guess for display only
+            issued_at = issuance if now - issuance >= PUBLISH_GRACE else previous_issuance
+            attributed = False
+
+        snapshot.issued_at = issued_at
+        self._snapshot = snapshot
+        self._snapshot_key = (issued_at if attributed else None, time_from)
+        self._snapshot_seen_at = now
+
+        if attributed:
+            self._archive_snapshot(snapshot)
+        if issued_at != issuance or not attributed:
+            print(f"[DEBUG] Issuance {issuance} not seen yet, will re-check")
+
+    def _archive_snapshot(self, snapshot: ForecastSnapshot):
+        """Append a freshly fetched snapshot to the archive (failures are only logged)"""
+        try:
+            rows = self.archive.append(snapshot)
+            print(f"[DEBUG] Archived {rows} forecast rows for issuance {snapshot.issued_at}")
+        except Exception as e:
+            print(f"Error archiving forecast snapshot: {e}")
+
+    async def _fetch_snapshot(self, time_from: str, time_to: str, issued_at: datetime) -> Optional[ForecastSnapshot]:
+        """Fetch all counties in one request and build a ForecastSnapshot"""
+        params = {
+            'Authorization': self.api_key,
+            'timeFrom': time_from,
+            'timeTo': time_to
+        }
+
+        try:
+            status, data = await self.transport.get_json(self.base_url, params)
+            if status != 200:
+                print(f"API Error: Status {status}")
+                return None
+
+            if not data.get('success'):
+                print(f"API returned success=False")
+                return None
+
+            return ForecastSnapshot.from_response(data, issued_at)
+
+        except Exception as e:
+            print(f"Error fetching forecast snapshot: {e}")
+            return None
+
+    async def refresh_stations(self) -> bool:
+        """
+        Fetch every automatic and staffed weather station and rebuild the spatial index
+
+        Returns:
+            True if the index was replaced
+        """
+        params = {
+            'Authorization': self.api_key
+        }
+
+        results = await asyncio.gather(
+            *(self.transport.get_json(url, params) for url in self.observation_urls),
+            return_exceptions=True
+        )
+
+        # Index whatever came back; one failed dataset only drops its stations
+        responses = []
+        for url, result in zip(self.observation_urls, results):
+            if isinstance(result, Exception):
+                print(f"Error fetching station observations from {url}: {result}")
+                continue
+
+            status, data = result
+            if status != 200:
+                print(f"API Error: Status {status}")
+            elif not data.get('success'):
+                print(f"API returned success=False")
+            else:
+                responses.append(data)
+
+        if not responses:
+            return False
+
+        try:
+            stations = StationIndex.from_response(*responses)
+            if stations is None:
+                return False
+
+            # Swap in the new index atomically; readers keep the old one until then
+            self.stations = stations
+            print(f"[DEBUG] Indexed {len(stations)} reporting stations (observed {stations.observed_at})")
+            return True
+
+        except Exception as e:
+            print(f"Error parsing station observations: {e}")
+            return False
+
+    @property
+    def places(self) -> Dict[str, Tuple[float, float]]:
+        """
+        Township and county coordinates for resolving /now locations
+
+        Taken from the township table of the week forecast, or from the
+        station centroids until that has been loaded.
+        """
+        if self.week is not None and self.week.places:
+            return self.week.places
+        if self.stations is not None:
+            return self.stations.places
+        return {}
+
+    def save_cache(self, directory: str) -> bool:
+        """
+        Write the cached snapshot (and week forecast) to disk so the next process can start warm
+
+        Args:
+            directory: Cache directory
+
+        Returns:
+            True if a snapshot was saved
+        """
+        os.makedirs(directory, exist_ok=True)
+        if self.week is not None:
+            self.week.save(os.path.join(directory, 'week.npz'))
+
+        if self._snapshot is None:
+            return False
+
+        self._snapshot.save(
+            os.path.join(directory, 'snapshot.npz'),
+            time_from=self._snapshot_key[1],
+            confirmed='1' if self._snapshot_key[0] is not None else '0',
+            seen_at=self._snapshot_seen_at.isoformat() if self._snapshot_seen_at else ''
+        )
+        return True
+
+    def load_cache(self, directory: str) -> bool:
+        """
+        Restore a snapshot (and week forecast) written by `save_cache`
+
+        A restored snapshot is served while its period window is still current
+        and re-checked like a fetched one once a newer issuance is due.
+
+        Args:
+            directory: Cache directory
+
+        Returns:
+            True if a snapshot was restored
+        """
+        week_path = os.path.join(directory, 'week.npz')
+        if os.path.exists(week_path):
+            try:
+                self.week = WeekForecast.load(week_path)
+            except Exception as e:
+                print(f"Error loading cached week forecast: {e}")
+
+        path = os.path.join(directory, 'snapshot.npz')
+        if not os.path.exists(path):
+            return False
+
+        try:
+            snapshot, extra = ForecastSnapshot.load(path)
+        except Exception as e:
+            print(f"Error loading cached snapshot: {e}")
+            return False
+
+        self._snapshot = snapshot
+        confirmed = extra.get('confirmed', '1') == '1'
+        self._snapshot_key = (snapshot.issued_at if confirmed else None, extra.get('time_from'))
+        seen_at = extra.get('seen_at')
+        self._snapshot_seen_at = datetime.fromisoformat(seen_at) if seen_at else None
+        return True
+
+    def _get_time_range(self) -> Tuple[str, str]:
+        """
+        Compute the timeFrom/timeTo window that covers the current forecast period
+
+        Returns:
+            Tuple of (time_from, time_to) formatted for the API
+        """
         # Get current time in UTC+8 (Taiwan timezone)
         taiwan_tz = timezone(timedelta(hours=8))
         current_time = datetime.now(taiwan_tz)
@@ -62,32 +417,7 @@ class WeatherService:
         print(f"[DEBUG] Current time: {current_time.strftime('%Y-%m-%d %H:%M:%S')} (hour={current_time.hour}, is_daytime={is_daytime})")
         print(f"[DEBUG] Requesting periods from {time_from} to {time_to}")
 
-        params = {
-            'Authorization': self.api_key,
-            'locationName': location,
-            'timeFrom': time_from,
-            'timeTo': time_to
-        }
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.base_url, params=params) as response:
-                    if response.status != 200:
-                        print(f"API Error: Status {response.status}")
-                        return None
-
-                    data = await response.json()
-
-                    if not data.get('success'):
-                        print(f"API returned success=False")
-                        return None
-
-                    # Parse the weather data
-                    return self._parse_weather_data(data, location)
-
-        except Exception as e:
-            print(f"Error fetching weather data: {e}")
-            return None
+        return time_from, time_to
 
     def _parse_weather_data(self, data: dict, location: str) -> Dict:
         """
@@ -164,42 +494,7 @@ class WeatherService:
                 start_time_tw = datetime.strptime(period_data['start_time'], '%Y-%m-%d %H:%M:%S')
                 end_time_tw = datetime.strptime(period_data['end_time'], '%Y-%m-%d %H:%M:%S')
 
-                # Get current time in Taiwan timezone (UTC+8)
-                taiwan_tz = timezone(timedelta(hours=8))
-                current_time_tw = datetime.now(taiwan_tz).replace(tzinfo=None)
-
-                # Determine period label based on date and time
-                hour = start_time_tw.hour
-                start_date = start_time_tw.date()
-                current_date = current_time_tw.date()
-                date_diff = (start_date - current_date).days
-
-                # Debug: Print labeling logic
-                print(f"[DEBUG] Period {period_idx + 1}: start={start_time_tw}, current={current_time_tw}")
-                print(f"[DEBUG] start_date={start_date}, current_date={current_date}, date_diff={date_diff}, hour={hour}")
-
-                # Simplified logic based on period start hour
-                if 0 <= hour < 6:
-                    # Early morning (00:00-06:00) - always part of last night
-                    period_label = "昨晚"
-                elif 6 <= hour < 18:
-                    # Daytime period (06:00-18:00)
-                    if date_diff == 0:
-                        period_label = "今天白天"
-                    elif date_diff == 1:
-                        period_label = "明天白天"
-                    else:
-                        period_label = "白天"
-                else:
-                    # Evening/night period (18:00-24:00)
-                    if date_diff == 0:
-                        period_label = "今晚"
-                    elif date_diff == -1:
-                        period_label = "昨晚"
-                    elif date_diff == 1:
-                        period_label = "明晚"
-                    else:
-                        period_label = "晚上"
+                period_label = self._get_period_label(start_time_tw)
 
                 print(f"[DEBUG] Assigned label: {period_label}\n")
                 period_data['period_label'] = period_label
@@ -213,6 +508,55 @@ class WeatherService:
             print(f"Error parsing weather data: {e}")
             return None
 
+    def _get_period_label(self, start_time_tw: datetime) -> str:
+        """
+        Label a forecast period (今天白天, 今晚, 明天白天...) relative to the current Taiwan date
+
+        Args:
+            start_time_tw: Period start time (naive, Taiwan time)
+
+        Returns:
+            Chinese period label
+        """
+        # Get current time in Taiwan timezone (UTC+8)
+        taiwan_tz = timezone(timedelta(hours=8))
+        current_time_tw = datetime.now(taiwan_tz).replace(tzinfo=None)
+
+        # Determine period label based on date and time
+        hour = start_time_tw.hour
+        start_date = start_time_tw.date()
+        current_date = current_time_tw.date()
+        date_diff = (start_date - current_date).days
+
+        # Debug: Print labeling logic
+        print(f"[DEBUG] Period: start={start_time_tw}, current={current_time_tw}")
+        print(f"[DEBUG] start_date={start_date}, current_date={current_date}, date_diff={date_diff}, hour={hour}")
+
+        # Simplified logic based on period start hour
+        if 0 <= hour < 6:
+            # Early morning (00:00-06:00) - always part of last night
+            period_label = "昨晚"
+        elif 6 <= hour < 18:
+            # Daytime period (06:00-18:00)
+            if date_diff == 0:
+                period_label = "今天白天"
+            elif date_diff == 1:
+                period_label = "明天白天"
+            else:
+                period_label = "白天"
+        else:
+            # Evening/night period (18:00-24:00)
+            if date_diff == 0:
+                period_label = "今晚"
+            elif date_diff == -1:
+                period_label = "昨晚"
+            elif date_diff == 1:
+                period_label = "明晚"
+            else:
+                period_label = "晚上"
+
+        return period_label
+
     async def get_detailed_forecast(self, location: str) -> Optional[Dict]:
         """
         Get more detailed weather information including wind, humidity, etc.
@@ -227,11 +571,50 @@ class WeatherService:
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(detailed_url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    return None
+            status, data = await self.transport.get_json(detailed_url, params)
+            if status == 200:
+                return data
+            return None
         except Exception as e:
             print(f"Error fetching detailed forecast: {e}")
             return None
+
+    async def refresh_week_forecast(self) -> bool:
+        """
+        Bulk-fetch the one-week township forecasts for every county
+
+        All 22 weekly F-D0047 datasets are requested in one F-D0047-093 call
+        and stored as a WeekForecast, so /week never hits the API.
+
+        Returns:
+            True if the forecast was replaced
+        """
+        bulk_url = "https://opendata.cwa.gov.tw/api/v1/rest/datastore/F-D0047-093"
+
+        params = {
+            'Authorization': self.api_key,
+            'locationId': ','.join(WEEKLY_DATASETS.values()),
+            'ElementName': '最低溫度,最高溫度,12小時降雨機率,天氣現象'
+        }
+
+        try:
+            status, data = await self.transport.get_json(bulk_url, params)
+            if status != 200:
+                print(f"API Error: Status {status}")
+                return False
+
+            if not data.get('success'):
+                print(f"API returned success=False")
+                return False
+
+            week = WeekForecast.from_response(data)
+            if week is None:
+                return False
+
+            self.week = week
+            print(f"[DEBUG] Loaded 7-day forecast for {len(week.towns)} townships ({week.values.nbytes + week.weather.nbytes} bytes)")
+            return True
+
+        except Exception as e:
+            print(f"Error fetching week forecast: {e}")
+            return False
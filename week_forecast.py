@@ -0,0 +1,263 @@
+import numpy as np
+import warnings
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple
+
+
+# One-week township forecast dataset for each county (F-D0047 family)
+WEEKLY_DATASETS = {
+    "宜蘭縣": "F-D0047-003", "桃園市": "F-D0047-007", "新竹縣": "F-D0047-011",
+    "苗栗縣": "F-D0047-015", "彰化縣": "F-D0047-019", "南投縣": "F-D0047-023",
+    "雲林縣": "F-D0047-027", "嘉義縣": "F-D0047-031", "屏東縣": "F-D0047-035",
+    "臺東縣": "F-D0047-039", "花蓮縣": "F-D0047-043", "澎湖縣": "F-D0047-047",
+    "基隆市": "F-D0047-051", "新竹市": "F-D0047-055", "嘉義市": "F-D0047-059",
+    "臺北市": "F-D0047-063", "高雄市": "F-D0047-067", "新北市": "F-D0047-071",
+    "臺中市": "F-D0047-075", "臺南市": "F-D0047-079", "連江縣": "F-D0047-083",
+    "金門縣": "F-D0047-087",
+}
+
+# Numeric elements (last axis of `values`): ElementName -> key inside ElementValue
+ELEMENTS = (
+    ('最低溫度', 'MinTemperature'),
+    ('最高溫度', 'MaxTemperature'),
+    ('12小時降雨機率', 'ProbabilityOfPrecipitation'),
+)
+MIN_T, MAX_T, POP = range(len(ELEMENTS))
+
+# Every value is a whole number of °C or %, so int8 is enough
+MISSING = -128
+
+
+def normalize_town(name: str) -> str:
+    """Normalize user input for a township name (CWA spells 台 as 臺, no spaces)"""
+    return ''.join(name.split()).replace('台', '臺')
+
+
+def _to_int8(value) -> int:
+    try:
+        value = round(float(value))
+    except (TypeError, ValueError):
+        return MISSING
+    return value if -127 <= value <= 127 else MISSING
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_int(value: float) -> Optional[int]:
+    """Convert a reduced value back to int (None if missing)"""
+    return None if np.isnan(value) else int(round(value))
+
+
+class WeekForecast:
+    """
+    Seven-day township forecast for all of Taiwan as compact typed arrays
+
+    - values:  int8 array (township, step, element), MISSING where absent
+    - weather: uint8 array (township, step) of codes into `weather_text`
+    - steps:   start time of each 12-hour step (shared by all townships)
+    - lat/lon: township coordinates (WGS84, NaN if not given)
+    """
+
+    def __init__(self, counties: List[str], towns: List[str], town_county: np.ndarray,
+                 steps: List[datetime], values: np.ndarray, weather: np.ndarray, weather_text: List[str],
+                 lat: Optional[np.ndarray] = None, lon: Optional[np.ndarray] = None):
+        self.counties = counties
+        self.towns = towns
+        self.town_county = town_county
+        self.steps = steps
+        self.values = values
+        self.weather = weather
+        self.weather_text = weather_text
+        self.lat = lat if lat is not None else np.full(len(towns), np.nan)
+        self.lon = lon if lon is not None else np.full(len(towns), np.nan)
+
+        self.index = {f"{counties[c]} {town}": idx for idx, (c, town) in enumerate(zip(town_county, towns))}
+
+        # Township coordinates plus county centroids, e.g. for resolving /now locations
+        self.places: Dict[str, Tuple[float, float]] = {}
+        located = ~(np.isnan(self.lat) | np.isnan(self.lon))
+        for code, county in enumerate(counties):
+            members = np.flatnonzero((town_county == code) & located)
+            if members.size:
+                self.places[county] = (float(self.lat[members].mean()), float(self.lon[members].mean()))
+        for name, idx in self.index.items():
+            if located[idx]:
+                self.places[name] = (float(self.lat[idx]), float(self.lon[idx]))
+
+        # Steps are sorted, so each day is a contiguous run: keep its first step for
+        # reduceat and its daytime step (if any) for the weather description
+        self.dates = sorted({step.date() for step in steps})
+        day_starts, weather_steps = [], []
+        for date in self.dates:
+            members = [i for i, step in enumerate(steps) if step.date() == date]
+            daytime = [i for i in members if 6 <= steps[i].hour < 18] or members
+            day_starts.append(members[0])
+            weather_steps.append(daytime[0])
+        self.day_starts = np.array(day_starts, dtype=np.intp)
+        self.weather_steps = np.array(weather_steps, dtype=np.intp)
+
+    def towns_in(self, county: str) -> List[str]:
+        """Township names of a county, in dataset order"""
+        if county not in self.counties:
+            return []
+        code = self.counties.index(county)
+        return [self.towns[idx] for idx in np.flatnonzero(self.town_county == code)]
+
+    @classmethod
+    def from_response(cls, data: dict) -> Optional['WeekForecast']:
+        """
+        Build the arrays from an F-D0047-093 response covering the weekly datasets
+
+        Args:
+            data: Raw API response
+
+        Returns:
+            WeekForecast or None if the response has no townships
+        """
+        counties: List[str] = []
+        towns: List[str] = []
+        town_county: List[int] = []
+        coords: List[Tuple[float, float]] = []
+        rows: List[Dict] = []
+        step_index: Dict[str, int] = {}
+
+        for county_data in data['records']['Locations']:
+            county = county_data['LocationsName']
+            if county not in counties:
+                counties.append(county)
+
+            for town_data in county_data['Location']:
+                towns.append(town_data['LocationName'])
+                town_county.append(counties.index(county))
+                coords.append((_to_float(town_data.get('Latitude')), _to_float(town_data.get('Longitude'))))
+
+                elements = {e['ElementName']: e['Time'] for e in town_data['WeatherElement']}
+                rows.append(elements)
+                for time_data in elements.get(ELEMENTS[MAX_T][0], []):
+                    step_index.setdefault(time_data['StartTime'], len(step_index))
+
+        if not rows:
+            return None
+
+        # Steps are shared; sort them in case counties list them differently
+        ordered = sorted(step_index, key=datetime.fromisoformat)
+        step_index = {start: idx for idx, start in enumerate(ordered)}
+
+        values = np.full((len(rows), len(ordered), len(ELEMENTS)), MISSING, dtype=np.int8)
+        weather = np.zeros((len(rows), len(ordered)), dtype=np.uint8)
+        weather_text = ['']
+        weather_codes = {'': 0}
+
+        for town_idx, elements in enumerate(rows):
+            for element_idx, (name, key) in enumerate(ELEMENTS):
+                for time_data in elements.get(name, []):
+                    step = step_index.get(time_data['StartTime'])
+                    if step is not None:
+                        values[town_idx, step, element_idx] = _to_int8(time_data['ElementValue'][0].get(key))
+
+            for time_data in elements.get('天氣現象', []):
+                step = step_index.get(time_data['StartTime'])
+                if step is None:
+                    continue
+                text = time_data['ElementValue'][0].get('Weather', '')
+                if text not in weather_codes and len(weather_text) < 255:
+                    weather_codes[text] = len(weather_text)
+                    weather_text.append(text)
+                weather[town_idx, step] = weather_codes.get(text, 0)
+
+        return cls(
+            counties, towns, np.array(town_county, dtype=np.uint8),
+            [datetime.fromisoformat(start) for start in ordered],
+            values, weather, weather_text,
+            np.array([lat for lat, _ in coords]), np.array([lon for _, lon in coords])
+        )
+
+    def daily(self, county: str, town: Optional[str] = None) -> Optional[List[Dict]]:
+        """
+        Reduce one township (or a whole county) to one row per day
+
+        Args:
+            county: County name
+            town: Township name, or None for the county-wide median
+
+        Returns:
+            List of {'date', 'weather_description', 'low_temp', 'high_temp', 'pop'}
+            (numbers may be None if missing), or None if the place is unknown
+        """
+        town = normalize_town(town) if town else None
+        if town:
+            idx = self.index.get(f"{county} {town}")
+            if idx is None:
+                return None
+            rows = self.values[idx:idx + 1]
+            codes = self.weather[idx]
+        else:
+            if county not in self.counties:
+                return None
+            members = np.flatnonzero(self.town_county == self.counties.index(county))
+            rows = self.values[members]
+            # Most common weather per step across the county
+            codes = np.array([np.bincount(col).argmax() for col in self.weather[members].T], dtype=np.uint8)
+
+        data = np.where(rows == MISSING, np.nan, rows.astype(np.float32))
+        with warnings.catch_warnings():
+            # All-missing steps legitimately reduce to NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            per_step = data[0] if town else np.nanmedian(data, axis=0)
+
+        if not self.dates:
+            return []
+
+        # fmin/fmax ignore NaN unless the whole day is missing
+        low = np.fmin.reduceat(per_step[:, MIN_T], self.day_starts)
+        high = np.fmax.reduceat(per_step[:, MAX_T], self.day_starts)
+        pop = np.fmax.reduceat(per_step[:, POP], self.day_starts)
+        weather = codes[self.weather_steps]
+
+        days = []
+        for idx, date in enumerate(self.dates):
+            days.append({
+                'date': date,
+                'weather_description': self.weather_text[weather[idx]],
+                'low_temp': _to_int(low[idx]),
+                'high_temp': _to_int(high[idx]),
+                'pop': _to_int(pop[idx]),
+            })
+
+        return days
+
+    def save(self, path: str):
+        """Save the arrays to an .npz file"""
+        np.savez(
+            path,
+            counties=np.array(self.counties, dtype=str),
+            towns=np.array(self.towns, dtype=str),
+            town_county=self.town_county,
+            steps=np.array([step.isoformat() for step in self.steps], dtype=str),
+            values=self.values,
+            weather=self.weather,
+            weather_text=np.array(self.weather_text, dtype=str),
+            lat=self.lat,
+            lon=self.lon,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'WeekForecast':
+        """Load arrays saved with `save`"""
+        with np.load(path) as data:
+            return cls(
+                [str(c) for c in data['counties']],
+                [str(t) for t in data['towns']],
+                data['town_county'],
+                [datetime.fromisoformat(str(s)) for s in data['steps']],
+                data['values'],
+                data['weather'],
+                [str(w) for w in data['weather_text']],
+                data['lat'] if 'lat' in data.files else None,
+                data['lon'] if 'lon' in data.files else None,
+            )